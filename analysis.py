@@ -1,58 +1,117 @@
 import sys
 import json
 import os
-import cv2
-import numpy as np
 import math
-import joblib
-from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+import startup
+
+# Heavy modules are imported on first use; see startup.py
+cv2 = startup.lazy_import('cv2')
+np = startup.lazy_import('numpy')
+forest_engine = startup.lazy_import('forest_engine')
+extraction_pool = startup.lazy_import('extraction_pool')
+feature_cache = startup.lazy_import('feature_cache')
+model_bundle = startup.lazy_import('model_bundle')
+prediction_cache = startup.lazy_import('prediction_cache')
+imaging = startup.lazy_import('imaging')
+quality_gate = startup.lazy_import('quality_gate')
+metrics = startup.lazy_import('metrics')
+framing = startup.lazy_import('framing')
 
 MODEL_DIR = os.path.join('/var/www/dmittest/public/ai_models')
 UPLOAD_DIR = os.path.join('/var/www/dmittest/public/uploads')
 
+# Bump whenever extract_fingerprint_features changes its output
+FEATURE_VERSION = 'basic-1'
+
 def load_models():
     """Load all trained models"""
-    model_files = {
-        'personality': 'trained_model_personality.pkl',
-        'disc': 'trained_model_disc.pkl',
-        'learning': 'trained_model_learning.pkl',
-        'holland': 'trained_model_holland.pkl',
-        'mi': 'trained_model_mi.pkl',
-        'sensing': 'trained_model_sensing.pkl',
-        'thought': 'trained_model_thought.pkl',
-        'psych': 'trained_model_psych.pkl',
-        'leadership': 'trained_model_leadership.pkl'
-    }
-    
-    models = {}
-    for name, file in model_files.items():
-        try:
-            models[name] = joblib.load(os.path.join(MODEL_DIR, file))
-        except Exception as e:
-            raise RuntimeError(f"Failed to load {name} model: {str(e)}")
-    
-    return models
+    compiled = forest_engine.load_if_available(MODEL_DIR, MODEL_NAMES)
+    if compiled is not None:
+        return compiled
+    return model_bundle.load_models(MODEL_DIR, MODEL_NAMES)
+
+def describe_image(image_path):
+    """Image path for error messages; framed input arrives as bytes"""
+    if isinstance(image_path, bytes):
+        return f"<{len(image_path)} bytes>"
+    return image_path
 
 def extract_fingerprint_features(image_path):
-    """Extract detailed fingerprint features using OpenCV"""
+    """Extract detailed fingerprint features using OpenCV, reusing cached results for known images"""
     try:
-        img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        data = imaging.read_image_bytes(image_path)
+        if data is None:
+            raise ValueError(f"Could not read image: {describe_image(image_path)}")
+        return feature_cache.get_cache().get_or_compute(
+            data, FEATURE_VERSION + imaging.decode_variant(), lambda: compute_fingerprint_features(data, image_path)
+        )
+    except Exception as e:
+        raise RuntimeError(f"Feature extraction failed: {str(e)}")
+
+def compute_fingerprint_features(data, image_path):
+    """Compute the features of one encoded fingerprint image"""
+    img = imaging.load_resized(data)
+    if img is None:
+        raise ValueError(f"Could not read image: {describe_image(image_path)}")
+    return features_from_images([img])[0]
+
+def load_fingerprint(image_path):
+    """Cached features of one fingerprint, or (cache key, resized image) on a cache miss"""
+    try:
+        data = imaging.read_image_bytes(image_path)
+        if data is None:
+            raise ValueError(f"Could not read image: {describe_image(image_path)}")
+        key = feature_cache.FeatureCache.make_key(data, FEATURE_VERSION + imaging.decode_variant())
+        features = feature_cache.get_cache().get(key)
+        if features is not None:
+            return features
+        img = imaging.load_resized(data)
         if img is None:
-            raise ValueError(f"Could not read image: {image_path}")
+            raise ValueError(f"Could not read image: {describe_image(image_path)}")
+        return key, img
+    except Exception as e:
+        raise RuntimeError(f"Feature extraction failed: {str(e)}")
 
-        img = cv2.resize(img, (500, 500))
-        _, thresh = cv2.threshold(img, 127, 255, cv2.THRESH_BINARY)
-        
-        contours, _ = cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        ridge_count = len(contours)
+def extract_test_features(fingerprints):
+    """Extract all fingers of a test: decode concurrently, then analyze the cache misses as one stack"""
+    features = extraction_pool.extract_all(fingerprints, load_fingerprint)
+    pending = [finger for finger, loaded in features.items() if isinstance(loaded, tuple)]
+    if not pending:
+        return features
+    if quality_gate.ENABLED:
+        with metrics.stage('quality_gate'):
+            quality_gate.check({finger: features[finger][1] for finger in pending})
+    
+    try:
+        computed = features_from_images([features[finger][1] for finger in pending])
+    except Exception as e:
+        raise RuntimeError(f"Feature extraction failed: {str(e)}")
+    
+    cache = feature_cache.get_cache()
+    for finger, finger_features in zip(pending, computed):
+        cache.put(features[finger][0], finger_features)
+        features[finger] = finger_features
+    return features
+
+def contour_step(thresh):
+    with metrics.stage('contours'):
+        return imaging.contour_summary(thresh)
+
+def features_from_images(images):
+    """Features of resized fingerprint images; only the contour step runs per image"""
+    stats = imaging.stack_statistics(images)
+    features = []
+    # Contour tracing is the costly per-image step; it runs concurrently on the extraction pool
+    summaries = extraction_pool.map_ordered(contour_step, stats['thresh'])
+    for i, (ridge_count, first_contour, _) in enumerate(summaries):
         
-        moments = cv2.moments(thresh)
-        cx = int(moments['m10'] / moments['m00']) if moments['m00'] != 0 else 250
-        cy = int(moments['m01'] / moments['m00']) if moments['m00'] != 0 else 250
+        m00 = stats['m00'][i]
+        cx = int(stats['m10'][i] / m00) if m00 != 0 else 250
+        cy = int(stats['m01'][i] / m00) if m00 != 0 else 250
         orientation = math.atan2(cy - 250, cx - 250) * 180 / math.pi
         
-        area = cv2.contourArea(contours[0]) if contours else 0
-        perimeter = cv2.arcLength(contours[0], True) if contours else 1
+        area = cv2.contourArea(first_contour) if ridge_count else 0
+        perimeter = cv2.arcLength(first_contour, True) if ridge_count else 1
         circularity = 4 * math.pi * (area / (perimeter * perimeter)) if perimeter != 0 else 0
         
         pattern_type = 0  # Loop
@@ -61,16 +120,15 @@ def extract_fingerprint_features(image_path):
         elif circularity < 0.3:
             pattern_type = 2  # Arch
 
-        return {
+        features.append({
             'ridge_count': ridge_count,
             'orientation': orientation,
             'pattern_type': pattern_type,
             'circularity': circularity,
-            'intensity_mean': np.mean(img),
-            'intensity_std': np.std(img)
-        }
-    except Exception as e:
-        raise RuntimeError(f"Feature extraction failed: {str(e)}")
+            'intensity_mean': stats['mean'][i],
+            'intensity_std': stats['std'][i]
+        })
+    return features
 
 def calculate_composite_features(features):
     """Calculate TFRC, ATD angles, and other composite metrics"""
@@ -97,8 +155,13 @@ def calculate_composite_features(features):
         'pattern_distribution': pattern_counts
     }
 
-def predict_dmit_results(models, features, composite):
-    """Run all model predictions"""
+MODEL_NAMES = [
+    'personality', 'disc', 'learning', 'holland', 'mi',
+    'sensing', 'thought', 'psych', 'leadership'
+]
+
+def build_input_features(features, composite):
+    """Build the model input row for one test"""
     input_features = []
     for finger in [
         'right_thumb', 'right_index', 'right_middle', 'right_ring', 'right_pinky',
@@ -114,34 +177,43 @@ def predict_dmit_results(models, features, composite):
             input_features += [0, 0, 0]
     
     input_features += [composite['tfrc'], composite['atd_angle']]
-    X = np.array([input_features])
+    return input_features
+
+def predict_dmit_results(models, features, composite):
+    """Run all model predictions"""
+    return predict_dmit_batch(models, [build_input_features(features, composite)], [composite])[0]
+
+def predict_dmit_batch(models, rows, composites):
+    """Run all model predictions for many tests stacked into one matrix"""
+    X = np.array(rows)
     
-    # Make predictions
-    results = {
-        'personality_type': models['personality'].predict(X)[0],
-        'disc_scores': models['disc'].predict(X)[0].tolist(),
-        'learning_style': models['learning'].predict(X)[0],
-        'holland_code': models['holland'].predict(X)[0],
-        'mi_scores': models['mi'].predict(X)[0].tolist(),
-        'sensing_capability': models['sensing'].predict(X)[0],
-        'thought_process': models['thought'].predict(X)[0],
-        'psychological_capability': models['psych'].predict(X)[0],
-        'leadership_style': models['leadership'].predict(X)[0],
-        'composite': composite
-    }
+    # Make predictions; every forest is walked once and classifiers
+    # return their probabilities alongside the labels
+    outputs = prediction_cache.predict_models(models, X, MODEL_NAMES)
     
-    # Calculate confidence scores
-    results['accuracy'] = round(max(
-        np.max(models['personality'].predict_proba(X)),
-        np.max(models['learning'].predict_proba(X)),
-        np.max(models['holland'].predict_proba(X)),
-        np.max(models['sensing'].predict_proba(X)),
-        np.max(models['thought'].predict_proba(X)),
-        np.max(models['psych'].predict_proba(X)),
-        np.max(models['leadership'].predict_proba(X))
-    ) * 100, 2)
+    batch = []
+    for i, composite in enumerate(composites):
+        results = {
+            'personality_type': outputs['personality']['value'][i],
+            'disc_scores': outputs['disc']['value'][i].tolist(),
+            'learning_style': outputs['learning']['value'][i],
+            'holland_code': outputs['holland']['value'][i],
+            'mi_scores': outputs['mi']['value'][i].tolist(),
+            'sensing_capability': outputs['sensing']['value'][i],
+            'thought_process': outputs['thought']['value'][i],
+            'psychological_capability': outputs['psych']['value'][i],
+            'leadership_style': outputs['leadership']['value'][i],
+            'composite': composite
+        }
+        
+        # Calculate confidence scores
+        results['accuracy'] = round(max(
+            np.max(outputs[name]['proba'][i])
+            for name in ['personality', 'learning', 'holland', 'sensing', 'thought', 'psych', 'leadership']
+        ) * 100, 2)
+        batch.append(results)
     
-    return results
+    return batch
 
 def generate_swot_analysis(predictions):
     """Generate comprehensive SWOT analysis based on multiple DMIT factors"""
@@ -303,41 +375,138 @@ def get_career_recommendations(holland_code):
         'Tertiary': holland_map.get(holland_code[2], [])
     }
 
+def error_response(e, input_data):
+    response = {
+        'status': 'error',
+        'message': str(e),
+        'test_id': input_data.get('test_id', -1) if isinstance(input_data, dict) else -1
+    }
+    # Per-finger reasons of a quality gate rejection
+    if getattr(e, 'rejections', None):
+        response['rejections'] = e.rejections
+    return response
+
+def prepare_input(input_data):
+    """Validate one payload and extract its features"""
+    if not isinstance(input_data, dict) or 'test_id' not in input_data or 'fingerprints' not in input_data:
+        raise ValueError("Invalid input format: missing 'test_id' or 'fingerprints'")
+    
+    with metrics.stage('extract'):
+        features = extract_test_features(input_data['fingerprints'])
+    
+    with metrics.stage('composite'):
+        composite = calculate_composite_features(features)
+    return features, composite
+
+def run_analysis(input_data, models=None):
+    """Analyze one test payload and return the report or an error response"""
+    return run_analysis_batch([input_data], models)[0]
+
+def run_analysis_batch(inputs, models=None):
+    """Analyze many test payloads with one prediction pass per model"""
+    results = [None] * len(inputs)
+    timings = [metrics.collect(input_data) for input_data in inputs]
+    prepared = []
+    
+    for i, input_data in enumerate(inputs):
+        token = metrics.activate(timings[i])
+        try:
+            features, composite = prepare_input(input_data)
+            prepared.append((i, features, composite))
+        except Exception as e:
+            results[i] = error_response(e, input_data)
+        finally:
+            metrics.deactivate(token)
+    
+    # Model loading and prediction are shared by every test of the batch
+    shared = metrics.Timings() if any(t is not None for t in timings) else None
+    token = metrics.activate(shared)
+    try:
+        if prepared:
+            predict_and_report(inputs, prepared, models, results)
+    finally:
+        metrics.deactivate(token)
+    
+    scored = {i for i, _, _ in prepared}
+    return [
+        metrics.finish(result, 'basic', timings[i], shared if i in scored else None)
+        for i, result in enumerate(results)
+    ]
+
+def predict_and_report(inputs, prepared, models, results):
+    try:
+        if models is None:
+            with metrics.stage('load_models'):
+                models = load_models()
+        with metrics.stage('predict'):
+            predictions = predict_dmit_batch(
+                models,
+                [build_input_features(features, composite) for _, features, composite in prepared],
+                [composite for _, _, composite in prepared]
+            )
+    except Exception as e:
+        for i, _, _ in prepared:
+            results[i] = error_response(e, inputs[i])
+        return
+    
+    for (i, _, _), prediction in zip(prepared, predictions):
+        try:
+            with metrics.stage('report'):
+                report = generate_full_report(prediction)
+            report['test_id'] = inputs[i]['test_id']
+            report['success'] = True
+            results[i] = report
+        except Exception as e:
+            results[i] = error_response(e, inputs[i])
+
+def read_inputs(input_file):
+    """Read a JSON array or JSON-lines file of test payloads"""
+    with open(input_file) as f:
+        text = f.read()
+    if text.lstrip().startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+def run_stream(stream):
+    """Analyze framed tests (see framing.py) from a binary stream, printing one report line per frame"""
+    models = load_models()
+    for input_data in framing.read_frames(stream):
+        print(json.dumps(run_analysis(input_data, models=models)), flush=True)
+
 def main():
+    startup.install_report(sys.argv)
     try:
         if len(sys.argv) < 2:
-            raise ValueError("Usage: python analysis.py <input_json_file>")
+            raise ValueError("Usage: python analysis.py <input_json_file> OR --batch <input_file> OR --stream [--startup-report]")
+        
+        if sys.argv[1] == '--stream':
+            run_stream(sys.stdin.buffer)
+            return
         
-        input_file = sys.argv[1]
+        batch = sys.argv[1] == '--batch'
+        input_file = sys.argv[2] if batch and len(sys.argv) > 2 else sys.argv[1]
         if not os.path.exists(input_file):
             raise FileNotFoundError(f"Input file not found: {input_file}")
         
+        if batch:
+            for result in run_analysis_batch(read_inputs(input_file)):
+                print(json.dumps(result))
+            return
+        
         with open(input_file) as f:
             input_data = json.load(f)
         
-        if 'test_id' not in input_data or 'fingerprints' not in input_data:
-            raise ValueError("Invalid input format: missing 'test_id' or 'fingerprints'")
-        
-        features = {}
-        for finger_type, img_path in input_data['fingerprints'].items():
-            features[finger_type] = extract_fingerprint_features(img_path)
-        
-        composite = calculate_composite_features(features)
-        models = load_models()
-        predictions = predict_dmit_results(models, features, composite)
-        report = generate_full_report(predictions)
-        report['test_id'] = input_data['test_id']
-        report['success'] = True
-
-        print(json.dumps(report))
+        result = run_analysis(input_data)
         
     except Exception as e:
-        error_response = {
+        result = {
             'status': 'error',
             'message': str(e),
-            'test_id': input_data.get('test_id', -1) if 'input_data' in locals() else -1
+            'test_id': -1
         }
-        print(json.dumps(error_response))
+    
+    print(json.dumps(result))
+    if result.get('status') == 'error':
         sys.exit(1)
 
 if __name__ == '__main__':
@@ -0,0 +1,132 @@
+"""
+Thin client for analysis_server.py.
+
+Drop-in for the existing invocations:
+
+    python analysis_client.py --file <path>
+    python analysis_client.py --realtime <json>
+    python analysis_client.py <input_json_file>
+    python analysis_client.py --stream < frames    (binary frames, see framing.py)
+
+Prints the report JSON returned by the daemon. If the daemon is not
+reachable the analysis runs in-process instead, so a stopped daemon only
+costs speed, never a failed test. Every request names DMIT_PIPELINE, so a
+daemon serving the other pipeline answers with an error instead of a
+report of the wrong kind.
+"""
+import sys
+import json
+import os
+import socket
+import framing
+
+SOCKET_PATH = os.environ.get('DMIT_SOCKET', '/tmp/dmit_analysis.sock')
+TCP_ADDRESS = os.environ.get('DMIT_TCP')
+PIPELINE = os.environ.get('DMIT_PIPELINE', 'full')
+TIMEOUT = float(os.environ.get('DMIT_CLIENT_TIMEOUT', 120))
+
+def connect():
+    if TCP_ADDRESS:
+        host, _, port = TCP_ADDRESS.rpartition(':')
+        return socket.create_connection((host or '127.0.0.1', int(port)), timeout=TIMEOUT)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(TIMEOUT)
+    try:
+        sock.connect(SOCKET_PATH)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+def with_pipeline(payload):
+    if isinstance(payload, list):
+        return [with_pipeline(item) for item in payload]
+    return dict(payload, pipeline=PIPELINE) if isinstance(payload, dict) else payload
+
+def request(sock, payload):
+    """Send one payload to the daemon and return its decoded response"""
+    with sock:
+        sock.sendall((json.dumps(with_pipeline(payload)) + '\n').encode())
+        with sock.makefile('rb') as stream:
+            line = stream.readline()
+    if not line:
+        raise ConnectionError("Analysis daemon closed the connection")
+    return json.loads(line)
+
+def stream_requests(sock, stream):
+    """Forward every frame of a binary stream to the daemon, printing one response line each"""
+    with sock, sock.makefile('rb') as responses:
+        # Frames cannot carry the pipeline, so it is checked once up front
+        sock.sendall((json.dumps({'pipeline': PIPELINE}) + '\n').encode())
+        answer = json.loads(responses.readline() or b'null')
+        if not isinstance(answer, dict) or answer.get('status') != 'ok':
+            raise ValueError(answer.get('message') if isinstance(answer, dict) else "Analysis daemon closed the connection")
+        for payload in framing.read_frames(stream):
+            sock.sendall(framing.encode_frame(payload['test_id'], payload['fingerprints']))
+            line = responses.readline()
+            if not line:
+                raise ConnectionError("Analysis daemon closed the connection")
+            print(line.decode().rstrip('\n'), flush=True)
+
+def local_pipeline():
+    if PIPELINE == 'basic':
+        import analysis as pipeline
+    else:
+        import full_model_based_analysis as pipeline
+    return pipeline
+
+def run_locally(payload):
+    return local_pipeline().run_analysis(payload)
+
+def run_stream(stream):
+    try:
+        sock = connect()
+    except OSError:
+        sock = None
+    if sock:
+        stream_requests(sock, stream)
+    else:
+        local_pipeline().run_stream(stream)
+
+def read_payload(argv):
+    if len(argv) == 1:
+        mode, data = '--file', argv[0]
+    elif len(argv) == 2:
+        mode, data = argv
+    else:
+        raise ValueError("Usage: python analysis_client.py --realtime <json> OR --file <path>")
+
+    if mode == '--realtime':
+        return json.loads(data)
+    if mode == '--file':
+        if not os.path.exists(data):
+            raise FileNotFoundError(f"Input file not found: {data}")
+        with open(data, 'r') as f:
+            return json.load(f)
+    raise ValueError("Invalid mode. Use --realtime or --file")
+
+def main(argv):
+    payload = None
+    try:
+        if argv == ['--stream']:
+            run_stream(sys.stdin.buffer)
+            return
+        payload = read_payload(argv)
+        try:
+            sock = connect()
+        except OSError:
+            sock = None
+        result = request(sock, payload) if sock else run_locally(payload)
+    except Exception as e:
+        result = {
+            "status": "error",
+            "message": str(e),
+            "test_id": payload.get('test_id', -1) if isinstance(payload, dict) else -1
+        }
+
+    print(json.dumps(result))
+    if result.get('status') == 'error':
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,194 @@
+"""
+Long-running analysis daemon.
+
+Loads the models once and answers analysis requests over a Unix socket
+(or a localhost TCP port). Each request is one JSON payload per line,
+`{"test_id": ..., "fingerprints": {...}}`, and each response is the same
+report JSON the CLI scripts print, one per line. A payload may name the
+`"pipeline"` it expects; the daemon refuses one meant for the other
+pipeline, and answers a payload holding nothing else with its own
+pipeline (analysis_client.py checks it before streaming frames). Full-pipeline payloads may
+add `"sections": [...]` (see SECTIONS in full_model_based_analysis.py) to
+get a partial report that only runs the models it needs. A JSON array of payloads
+is scored as one batch and answered with an array of reports. Binary
+frames (see framing.py) carrying the image bytes themselves can be mixed
+with JSON lines on the same connection; each is answered with one line.
+
+    python analysis_server.py [--pipeline full|basic] [--socket PATH | --tcp HOST:PORT]
+
+Send SIGHUP to reload the models after retraining (a failed reload is
+logged to stderr and the previous models keep serving), and SIGUSR1 to
+print the hit rates of the feature and prediction caches to stderr.
+"""
+import sys
+import json
+import os
+import signal
+import socketserver
+import threading
+import importlib
+import framing
+import feature_cache
+import prediction_cache
+
+SOCKET_PATH = os.environ.get('DMIT_SOCKET', '/tmp/dmit_analysis.sock')
+
+PIPELINES = {
+    'full': 'full_model_based_analysis',
+    'basic': 'analysis'
+}
+
+def close_models(models):
+    close = getattr(models, 'close', None)
+    if close is not None:
+        close()
+
+class ModelHolder:
+    """
+    Keeps the loaded models of one pipeline and swaps them on reload. The
+    replaced models are closed once the last request using them returns.
+    """
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.module = importlib.import_module(PIPELINES[pipeline])
+        self.lock = threading.Lock()
+        self.models = self.module.load_models()
+        self.users = {}
+
+    def reload(self):
+        try:
+            models = self.module.load_models()
+        except Exception as e:
+            # A half-deployed model directory must not take the daemon down
+            print(json.dumps({"status": "error", "message": f"Reload failed, keeping the loaded models: {e}"}),
+                  file=sys.stderr, flush=True)
+            return
+        with self.lock:
+            previous, self.models = self.models, models
+            idle = id(previous) not in self.users
+        if idle and previous is not models:
+            close_models(previous)
+
+    def release(self, models):
+        with self.lock:
+            self.users[id(models)] -= 1
+            if self.users[id(models)]:
+                return
+            del self.users[id(models)]
+            retired = models is not self.models
+        if retired:
+            close_models(models)
+
+    def check_pipeline(self, payload):
+        """Strip the requested pipeline from the payload(s), refusing the other pipeline"""
+        for item in payload if isinstance(payload, list) else [payload]:
+            requested = item.pop('pipeline', None) if isinstance(item, dict) else None
+            if requested is not None and requested != self.pipeline:
+                raise ValueError(f"The analysis daemon serves the {self.pipeline} pipeline, not {requested}")
+
+    def run(self, payload):
+        if isinstance(payload, dict) and set(payload) == {'pipeline'}:
+            self.check_pipeline(payload)
+            return {"status": "ok", "pipeline": self.pipeline}
+        self.check_pipeline(payload)
+        with self.lock:
+            models = self.models
+            self.users[id(models)] = self.users.get(id(models), 0) + 1
+        try:
+            if isinstance(payload, list):
+                return self.module.run_analysis_batch(payload, models=models)
+            return self.module.run_analysis(payload, models=models)
+        finally:
+            self.release(models)
+
+class AnalysisHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            # JSON never starts with the frame magic's first byte
+            head = self.rfile.peek(1)[:1]
+            if not head:
+                return
+            framed = head == framing.MAGIC[:1]
+            payload = None
+            try:
+                if framed:
+                    payload = framing.read_frame(self.rfile)
+                else:
+                    line = self.rfile.readline()
+                    if not line.strip():
+                        continue
+                    payload = json.loads(line)
+                result = self.server.holder.run(payload)
+            except Exception as e:
+                result = {
+                    "status": "error",
+                    "message": str(e),
+                    "test_id": payload.get('test_id', -1) if isinstance(payload, dict) else -1
+                }
+            self.wfile.write((json.dumps(result) + '\n').encode())
+            self.wfile.flush()
+            if framed and payload is None:
+                # The stream cannot be resynchronized after a broken frame
+                return
+
+class UnixAnalysisServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class TCPAnalysisServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def cache_stats():
+    return {
+        'features': feature_cache.get_cache().stats(),
+        'predictions': prediction_cache.get_cache().stats()
+    }
+
+def parse_address(value):
+    host, _, port = value.rpartition(':')
+    return (host or '127.0.0.1', int(port))
+
+def create_server(holder, socket_path=None, tcp=None):
+    if tcp:
+        server = TCPAnalysisServer(parse_address(tcp), AnalysisHandler)
+    else:
+        path = socket_path or SOCKET_PATH
+        if os.path.exists(path):
+            os.unlink(path)
+        server = UnixAnalysisServer(path, AnalysisHandler)
+        os.chmod(path, 0o660)
+    server.holder = holder
+    return server
+
+def main(argv):
+    options = {'--pipeline': 'full', '--socket': None, '--tcp': None}
+    args = list(argv)
+    while args:
+        flag = args.pop(0)
+        if flag not in options or not args:
+            raise ValueError("Usage: python analysis_server.py [--pipeline full|basic] [--socket PATH | --tcp HOST:PORT]")
+        options[flag] = args.pop(0)
+
+    if options['--pipeline'] not in PIPELINES:
+        raise ValueError(f"Unknown pipeline: {options['--pipeline']}")
+
+    holder = ModelHolder(options['--pipeline'])
+    server = create_server(holder, options['--socket'], options['--tcp'])
+    signal.signal(signal.SIGHUP, lambda signum, frame: holder.reload())
+    signal.signal(signal.SIGUSR1, lambda signum, frame: print(json.dumps(cache_stats()), file=sys.stderr, flush=True))
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if not options['--tcp'] and os.path.exists(options['--socket'] or SOCKET_PATH):
+            os.unlink(options['--socket'] or SOCKET_PATH)
+
+if __name__ == '__main__':
+    try:
+        main(sys.argv[1:])
+    except Exception as e:
+        print(json.dumps({"status": "error", "message": str(e), "test_id": -1}))
+        sys.exit(1)
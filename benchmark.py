@@ -0,0 +1,253 @@
+"""
+Benchmark suite for the analysis pipelines.
+
+Generates a deterministic synthetic fingerprint corpus and toy forests
+shaped like the ones train_model.py produces (same tree counts, feature
+counts and targets), so it runs anywhere without /var/www paths. Every
+stage is timed on its own, plus the end-to-end run_analysis:
+
+    extract      extract_fingerprint_features / extract_features (per finger)
+    composite    calculate_composite_features / calculate_composite
+    load_models  pickles, model bundle and compiled engine, up to every model
+                 being usable (the bundle unpickles lazily, so its models are
+                 touched inside the timed call)
+    predict      predict_dmit_results / predict, pickles, bundle and compiled engine
+    report       generate_full_report / build_report
+    end_to_end   run_analysis
+
+    python benchmark.py [--pipeline basic|full|all] [--repeat N] [--output results.json]
+                        [--compare baseline.json] [--tolerance 0.2]
+
+--compare exits with status 1 when a stage's median is more than
+--tolerance slower than in the baseline file.
+"""
+import sys
+import json
+import os
+import time
+import platform
+import tempfile
+import statistics
+from collections.abc import Mapping
+
+# Benchmark the extractor and the engines themselves, not the feature and prediction caches
+os.environ['DMIT_FEATURE_CACHE_ITEMS'] = '0'
+os.environ.pop('DMIT_FEATURE_CACHE_DIR', None)
+os.environ['DMIT_PREDICTION_CACHE_ITEMS'] = '0'
+
+import cv2
+import numpy as np
+import joblib
+
+USAGE = ("Usage: python benchmark.py [--pipeline basic|full|all] [--repeat N] [--output PATH] "
+         "[--compare BASELINE] [--tolerance FRACTION]")
+
+FINGERS = [
+    'right_thumb', 'right_index', 'right_middle', 'right_ring', 'right_pinky',
+    'left_thumb', 'left_index', 'left_middle', 'left_ring', 'left_pinky'
+]
+
+# (n_estimators, max_depth, target) per model, as in train_model.py
+MODEL_SHAPES = {
+    'personality': (150, 10, ['ENFP', 'ISTJ', 'INTJ', 'ESFP', 'INFP', 'ESTJ']),
+    'disc': (100, None, 4),
+    'learning': (100, None, ['Visual', 'Auditory', 'Kinesthetic']),
+    'holland': (100, None, ['AIR', 'SEC', 'RIA', 'ESA', 'CRI']),
+    'mi': (100, None, 8),
+    'sensing': (50, None, ['High', 'Average', 'Low']),
+    'thought': (50, None, ['Analytical', 'Creative', 'Practical']),
+    'psych': (50, None, ['High', 'Medium', 'Low']),
+    'leadership': (50, None, ['Democratic', 'Transformational', 'Autocratic']),
+    'ocean': (100, None, 5),
+    'grit': (50, None, 1),
+    'aq': (50, None, 1),
+    'eq': (50, None, 1),
+    'emotional_regulation': (50, None, 1),
+    'flow_state': (50, None, 1),
+    'cognitive_load': (50, None, 1)
+}
+
+PIPELINES = {
+    'basic': {'module': 'analysis', 'features': 32, 'models': list(MODEL_SHAPES)[:9]},
+    'full': {'module': 'full_model_based_analysis', 'features': 54, 'models': list(MODEL_SHAPES)}
+}
+
+def make_fingerprint(seed, size=(1200, 1000)):
+    """Deterministic ridge-like image: warped concentric sinusoid plus noise"""
+    rng = np.random.default_rng(seed)
+    h, w = size
+    yy, xx = np.mgrid[:h, :w].astype(np.float32)
+    cx, cy = w * rng.uniform(0.4, 0.6), h * rng.uniform(0.4, 0.6)
+    stretch = rng.uniform(0.7, 1.4)
+    radius = np.hypot((xx - cx) * stretch, yy - cy)
+    angle = np.arctan2(yy - cy, xx - cx)
+    ridges = np.sin(radius / rng.uniform(4, 7) + rng.uniform(1, 3) * np.sin(angle * rng.integers(1, 4)))
+    img = 128 + 90 * ridges + rng.normal(0, 25, size)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+def make_corpus(directory, tests=2):
+    """Write PNG fingerprints and return one payload per synthetic test"""
+    payloads = []
+    for t in range(tests):
+        fingerprints = {}
+        for i, finger in enumerate(FINGERS):
+            path = os.path.join(directory, f'test{t}_{finger}.png')
+            cv2.imwrite(path, make_fingerprint(t * 100 + i))
+            fingerprints[finger] = path
+        payloads.append({'test_id': t + 1, 'fingerprints': fingerprints})
+    return payloads
+
+def make_toy_models(model_dir, names, n_features, rows=400, seed=42):
+    """Fit forests of production shape on random data and save them as pickles, a bundle and a compiled set"""
+    from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+    import forest_engine
+    import model_bundle
+
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(0, 20, (rows, n_features))
+    models = {}
+    for name in names:
+        n_estimators, max_depth, target = MODEL_SHAPES[name]
+        if isinstance(target, list):
+            model = RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, random_state=42)
+            y = rng.choice(target, rows)
+        else:
+            model = RandomForestRegressor(n_estimators=n_estimators, max_depth=max_depth, random_state=42)
+            y = rng.uniform(0, 100, (rows, target)) if target > 1 else rng.uniform(0, 100, rows)
+        models[name] = model.fit(X, y)
+
+    pickle_dir = os.path.join(model_dir, 'pickles')
+    compiled_dir = os.path.join(model_dir, 'compiled')
+    for directory in [pickle_dir, compiled_dir]:
+        os.makedirs(directory, exist_ok=True)
+        for name, model in models.items():
+            joblib.dump(model, os.path.join(directory, f'trained_model_{name}.pkl'))
+    forest_engine.save_compiled(models, compiled_dir)
+    bundle_dir = os.path.join(model_dir, 'bundle')
+    model_bundle.write_bundle(models, bundle_dir)
+    return pickle_dir, compiled_dir, bundle_dir
+
+def measure(fn, repeat):
+    """Run fn repeat times and summarize the wall-clock times in ms"""
+    fn()  # warm-up: lazy imports, page cache
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'median_ms': round(statistics.median(samples), 4),
+        'mean_ms': round(statistics.mean(samples), 4),
+        'min_ms': round(samples[0], 4),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        'repeat': repeat
+    }
+
+def load_all(module):
+    """load_models() plus the first access of every model"""
+    models = module.load_models()
+    if isinstance(models, Mapping):
+        for model_name in models:
+            models[model_name]
+    return models
+
+def bench_pipeline(name, workdir, repeat):
+    import importlib
+
+    spec = PIPELINES[name]
+    module = importlib.import_module(spec['module'])
+    payloads = make_corpus(os.path.join(workdir, 'images'))
+    pickle_dir, compiled_dir, bundle_dir = make_toy_models(os.path.join(workdir, name), spec['models'], spec['features'])
+
+    if name == 'basic':
+        extract, composite_fn = module.extract_fingerprint_features, module.calculate_composite_features
+        predict_fn, report_fn = module.predict_dmit_results, module.generate_full_report
+    else:
+        extract, composite_fn = module.extract_features, module.calculate_composite
+        predict_fn, report_fn = module.predict, module.build_report
+
+    payload = payloads[0]
+    image = payload['fingerprints'][FINGERS[0]]
+    features = {finger: extract(path) for finger, path in payload['fingerprints'].items()}
+    composite = composite_fn(features)
+
+    results = {}
+    results['extract'] = measure(lambda: extract(image), repeat)
+    results['composite'] = measure(lambda: composite_fn(features), repeat)
+
+    for engine, model_dir in [('pickle', pickle_dir), ('bundle', bundle_dir), ('compiled', compiled_dir)]:
+        module.MODEL_DIR = model_dir
+        results[f'load_models.{engine}'] = measure(lambda: load_all(module), max(1, repeat // 5))
+        models = module.load_models()
+        results[f'predict.{engine}'] = measure(lambda: predict_fn(models, features, composite), repeat)
+        predictions = predict_fn(models, features, composite)
+        results[f'end_to_end.{engine}'] = measure(lambda: module.run_analysis(payload), max(1, repeat // 5))
+
+    results['report'] = measure(lambda: report_fn(predictions), repeat)
+    return {f'{name}.{stage}': timing for stage, timing in results.items()}
+
+def compare(results, baseline, tolerance):
+    """Return the stages whose median regressed beyond tolerance"""
+    regressions = {}
+    for stage, timing in results.items():
+        previous = baseline.get('results', {}).get(stage)
+        if not previous:
+            continue
+        ratio = timing['median_ms'] / previous['median_ms'] if previous['median_ms'] else 1.0
+        if ratio > 1 + tolerance:
+            regressions[stage] = {
+                'baseline_ms': previous['median_ms'],
+                'current_ms': timing['median_ms'],
+                'ratio': round(ratio, 3)
+            }
+    return regressions
+
+def main(argv):
+    options = {'--pipeline': 'all', '--repeat': '20', '--output': None, '--compare': None, '--tolerance': '0.2'}
+    args = list(argv)
+    while args:
+        flag = args.pop(0)
+        if flag not in options or not args:
+            raise ValueError(USAGE)
+        options[flag] = args.pop(0)
+
+    names = list(PIPELINES) if options['--pipeline'] == 'all' else [options['--pipeline']]
+    if any(name not in PIPELINES for name in names):
+        raise ValueError(USAGE)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='dmit_bench_') as workdir:
+        os.makedirs(os.path.join(workdir, 'images'))
+        for name in names:
+            results.update(bench_pipeline(name, workdir, int(options['--repeat'])))
+
+    output = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__
+        },
+        'results': results
+    }
+
+    if options['--output']:
+        with open(options['--output'], 'w') as f:
+            json.dump(output, f, indent=2)
+
+    regressions = {}
+    if options['--compare']:
+        with open(options['--compare']) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, float(options['--tolerance']))
+        output['regressions'] = regressions
+
+    print(json.dumps(output, indent=2))
+    if regressions:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,246 @@
+"""
+Post-training compression of the compiled model set.
+
+Works on the node arrays of forest_engine and writes a new compiled_models
+set that load_models() picks up like any other:
+
+    tree subset    greedy forward selection of the fewest trees whose mean
+                   reproduces the full forest on the held-out split: label
+                   agreement >= 1 - tolerance and no class probability more
+                   than max-drift away for classifiers, RMSE <= tolerance *
+                   std of the full output for regressors
+    collapse       internal nodes whose two leaves hold identical values
+                   become leaves, bottom-up (lossless)
+    precision      int16 feature/child indices, thresholds rounded down to
+                   float32 (lossless for float32 inputs: x <= t64 exactly
+                   when x <= t32), float32 leaf values
+
+Trees are selected on the held-out split of train_model.py because every
+training row was seen by most trees, so any single tree already agrees
+with the forest there. Accuracy and MSE on that split are reported next to
+the uncompressed models, and the set is only written when no metric gets
+worse by more than --max-drop (accuracy points, or relative MSE) and no
+class probability moves by more than --max-drift (the reports derive
+their accuracy field from these probabilities).
+Models are read from models.bundle, or from the trained_model_*.pkl files
+of older model directories. Models without training columns (the
+full-pipeline extras) are collapsed and narrowed but keep all their trees.
+
+    python compress_models.py [--tolerance 0.01] [--max-drop 0.01] [--max-drift 0.02]
+                              [--values float32|float64] [--dry-run] [--force]
+"""
+import sys
+import glob
+import json
+import os
+import numpy as np
+import joblib
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import accuracy_score, mean_squared_error
+import train_model
+import forest_engine
+import model_bundle
+
+USAGE = ("Usage: python compress_models.py [--tolerance F] [--max-drop F] [--max-drift F] "
+         "[--values float32|float64] [--dry-run] [--force]")
+
+def tree_bounds(compiled):
+    ends = np.cumsum(compiled['tree_nodes'])
+    return list(zip(ends - compiled['tree_nodes'], ends))
+
+def tree_outputs(compiled, X):
+    """Leaf values reached by every tree for every row: (trees, rows, outputs)"""
+    models = forest_engine.CompiledModelSet(*forest_engine.assemble_models({'model': compiled}))
+    return compiled['values'][models.apply(X)]
+
+def select_trees(outputs, is_classifier, tolerance, max_drift):
+    """Indices, in estimator order, of the fewest trees whose mean stays within tolerance of the full forest"""
+    full = outputs.mean(axis=0)
+    labels = np.argmax(full, axis=1)
+    scale = float(full.std()) or 1.0
+    chosen, total = [], np.zeros_like(full)
+    remaining = list(range(len(outputs)))
+
+    while remaining:
+        candidates = (total + outputs[remaining]) / (len(chosen) + 1)
+        deviation = np.abs(candidates - full)
+        distance = deviation.mean(axis=(1, 2))
+        drift = deviation.max(axis=(1, 2))
+        if is_classifier:
+            # Disagreement first, closeness of the probabilities breaks ties
+            error = (np.argmax(candidates, axis=2) != labels).mean(axis=1)
+            best = int(np.lexsort((distance, error))[0])
+        else:
+            error = np.sqrt(((candidates - full) ** 2).mean(axis=(1, 2))) / scale
+            best = int(np.argmin(error))
+        tree = remaining.pop(best)
+        chosen.append(tree)
+        total += outputs[tree]
+        if error[best] <= tolerance and (not is_classifier or drift[best] <= max_drift):
+            break
+    return sorted(chosen)
+
+def subset_trees(compiled, trees):
+    bounds = tree_bounds(compiled)
+    nodes = np.concatenate([np.arange(*bounds[t]) for t in trees])
+    subset = dict(compiled)
+    for key in ('feature', 'threshold', 'left', 'right', 'values'):
+        subset[key] = compiled[key][nodes]
+    subset['tree_nodes'] = compiled['tree_nodes'][trees]
+    return subset
+
+def collapse_tree(feature, threshold, left, right, values):
+    """Merge identical sibling leaves bottom-up and drop unreachable nodes; returns the new arrays and depth"""
+    n = len(feature)
+    leaf = left == np.arange(n)
+    values = values.copy()
+    # sklearn numbers children after their parent, so a reverse scan is bottom-up
+    for node in range(n - 1, -1, -1):
+        if not leaf[node] and leaf[left[node]] and leaf[right[node]] and np.array_equal(values[left[node]], values[right[node]]):
+            leaf[node] = True
+            values[node] = values[left[node]]
+
+    keep, depth, frontier, level = [], 0, [0], 0
+    while frontier:
+        keep += frontier
+        depth = level
+        frontier = [child for node in frontier if not leaf[node] for child in (left[node], right[node])]
+        level += 1
+    keep = np.array(sorted(keep))
+    position = np.full(n, -1)
+    position[keep] = np.arange(len(keep))
+
+    kept_leaf = leaf[keep]
+    own = np.arange(len(keep))
+    return (
+        np.where(kept_leaf, 0, feature[keep]),
+        np.where(kept_leaf, 0.0, threshold[keep]),
+        np.where(kept_leaf, own, position[left[keep]]),
+        np.where(kept_leaf, own, position[right[keep]]),
+        values[keep],
+        depth
+    )
+
+def collapse_leaves(compiled):
+    parts = [collapse_tree(*(compiled[key][start:end] for key in ('feature', 'threshold', 'left', 'right', 'values')))
+             for start, end in tree_bounds(compiled)]
+    collapsed = dict(compiled)
+    for i, key in enumerate(('feature', 'threshold', 'left', 'right', 'values')):
+        collapsed[key] = np.concatenate([part[i] for part in parts])
+    collapsed['tree_nodes'] = np.array([len(part[0]) for part in parts], dtype=np.int64)
+    collapsed['max_depth'] = int(max(part[5] for part in parts))
+    return collapsed
+
+def floor_float32(values):
+    """Largest float32 not above each float64 value"""
+    rounded = values.astype(np.float32)
+    above = rounded.astype(np.float64) > values
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+def reduce_precision(compiled, values_dtype):
+    index_dtype = np.int16 if compiled['tree_nodes'].max() <= np.iinfo(np.int16).max else np.int32
+    reduced = dict(compiled)
+    reduced['feature'] = compiled['feature'].astype(np.int16 if compiled['n_features'] <= np.iinfo(np.int16).max else np.int32)
+    reduced['threshold'] = floor_float32(compiled['threshold'])
+    reduced['left'] = compiled['left'].astype(index_dtype)
+    reduced['right'] = compiled['right'].astype(index_dtype)
+    reduced['values'] = compiled['values'].astype(values_dtype)
+    return reduced
+
+def compress(models, X, tolerance, max_drift, values_dtype):
+    """Compressed compile_forest() outputs by name, and per-model tree and node counts"""
+    compressed, summary = {}, {}
+    for name, model in models.items():
+        compiled = forest_engine.compile_forest(model)
+        before = {'trees': len(compiled['tree_nodes']), 'nodes': int(compiled['tree_nodes'].sum())}
+        if X is not None and compiled['n_features'] == X.shape[1]:
+            trees = select_trees(tree_outputs(compiled, X), compiled['kind'] == 'classifier', tolerance, max_drift)
+            compiled = subset_trees(compiled, trees)
+        compiled = reduce_precision(collapse_leaves(compiled), values_dtype)
+        compressed[name] = compiled
+        summary[name] = {
+            'trees': [before['trees'], len(compiled['tree_nodes'])],
+            'nodes': [before['nodes'], int(compiled['tree_nodes'].sum())]
+        }
+    return compressed, summary
+
+def score(outputs, name, y):
+    if name in train_model.CLASSIFIERS:
+        return accuracy_score(y, outputs[name]['value'])
+    return mean_squared_error(y, outputs[name]['value'])
+
+def probability_drift(original, smaller, name):
+    """Largest change of any class probability, None for regressors"""
+    if original[name]['proba'] is None:
+        return None
+    return float(np.abs(np.asarray(smaller[name]['proba']) - original[name]['proba']).max())
+
+def regressions(metrics, drift, max_drop, max_drift):
+    worse = {}
+    for name, (before, after) in metrics.items():
+        if name in train_model.CLASSIFIERS:
+            bad = after < before - max_drop
+        else:
+            bad = after > before * (1 + max_drop)
+        if bad or (drift.get(name) is not None and drift[name] > max_drift):
+            worse[name] = {'metric': [before, after], 'drift': drift.get(name)}
+    return worse
+
+def main(argv):
+    options = {'--tolerance': '0.01', '--max-drop': '0.01', '--max-drift': '0.02', '--values': 'float32'}
+    args = list(argv)
+    flags = {flag: flag in args for flag in ('--dry-run', '--force')}
+    args = [arg for arg in args if arg not in flags]
+    while args:
+        flag = args.pop(0)
+        if flag not in options or not args:
+            raise ValueError(USAGE)
+        options[flag] = args.pop(0)
+    if options['--values'] not in ('float32', 'float64'):
+        raise ValueError(USAGE)
+
+    bundle = model_bundle.open_bundle(train_model.MODEL_DIR)
+    source = bundle.version if bundle is not None else None
+    if bundle is not None:
+        models = dict(bundle)
+    else:
+        paths = sorted(glob.glob(os.path.join(train_model.MODEL_DIR, 'trained_model_*.pkl')))
+        models = {os.path.basename(path)[len('trained_model_'):-len('.pkl')]: joblib.load(path) for path in paths}
+    if not models:
+        raise FileNotFoundError(f"No trained models in {train_model.MODEL_DIR}")
+
+    df = train_model.load_and_preprocess_data(train_model.model_columns())
+    X = df[train_model.feature_columns()].values
+    y = train_model.build_targets(df)
+    # Same held-out split as train_model.train_models; no tree saw these rows
+    test_indices = train_test_split(np.arange(len(X)), test_size=0.2, random_state=42)[1]
+    max_drift = float(options['--max-drift'])
+    compressed, summary = compress(models, X[test_indices], float(options['--tolerance']), max_drift,
+                                   np.dtype(options['--values']))
+    meta, arrays = forest_engine.assemble_models(compressed, source)
+    meta['compression'] = {key.lstrip('-'): value for key, value in options.items()}
+
+    evaluated = [name for name in models if name in y]
+    original = forest_engine.predict_models(models, X[test_indices], evaluated)
+    smaller = forest_engine.CompiledModelSet(meta, arrays).predict(X[test_indices], evaluated)
+    metrics = {name: [score(original, name, y[name][test_indices]), score(smaller, name, y[name][test_indices])]
+               for name in evaluated}
+    drift = {name: probability_drift(original, smaller, name) for name in evaluated}
+    worse = regressions(metrics, drift, float(options['--max-drop']), max_drift)
+
+    uncompressed_bytes = sum(array.nbytes for array in forest_engine.compile_models(models)[1].values())
+    report = {
+        'models': {name: dict(summary[name], metric=metrics.get(name), drift=drift.get(name)) for name in models},
+        'bytes': [uncompressed_bytes, sum(array.nbytes for array in arrays.values())],
+        'regressions': worse
+    }
+
+    if not flags['--dry-run'] and (not worse or flags['--force']):
+        report['written'] = forest_engine.save_model_set(meta, arrays, train_model.MODEL_DIR)
+    print(json.dumps(report, indent=2))
+    if worse and not flags['--force']:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,165 @@
+"""
+Equivalence report for alternative extraction paths.
+
+Runs the extractors of both pipelines over a corpus of fingerprint images,
+once on the default path and once on the variant under test, and reports
+how far every feature drifts:
+
+    decode    reduced-resolution JPEG decode (DMIT_REDUCED_DECODE)
+    contours  connected-component contour summary (DMIT_CONTOUR_MODE=fast)
+
+    python equivalence.py decode|contours [--pipeline basic|full|all] [--synthetic TESTS]
+                          [<image or directory> ...]
+
+--synthetic adds the deterministic fingerprint corpus of benchmark.py
+(10 images per test). Variants that must not change any feature (contours)
+exit with status 1 unless every feature dict is bit-identical.
+
+Numeric features get mean/max absolute drift (and mean relative drift),
+categorical ones (pattern_type, pattern_subtype) an agreement rate. Also
+reported are the number of bit-identical feature dicts and the extraction
+time of both paths.
+"""
+import sys
+import json
+import os
+import time
+import tempfile
+
+import imaging
+
+USAGE = ("Usage: python equivalence.py decode|contours [--pipeline basic|full|all] [--synthetic TESTS] "
+         "[<image or directory> ...]")
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+
+CATEGORICAL = {'pattern_type', 'pattern_subtype'}
+
+def extractors(pipeline):
+    """(name, compute(data)) of the requested pipelines, bypassing the feature cache"""
+    chosen = []
+    if pipeline in ('basic', 'all'):
+        import analysis
+        chosen.append(('basic', lambda data: analysis.compute_fingerprint_features(data, '<corpus>')))
+    if pipeline in ('full', 'all'):
+        import full_model_based_analysis
+        chosen.append(('full', full_model_based_analysis.compute_features))
+    return chosen
+
+def corpus_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files += [os.path.join(root, name) for name in sorted(names) if name.lower().endswith(IMAGE_EXTENSIONS)]
+        else:
+            files.append(path)
+    return files
+
+def set_decode(reduced):
+    imaging.REDUCED_DECODE = reduced
+
+def set_contour_mode(mode):
+    imaging.CONTOUR_MODE = mode
+
+VARIANTS = {
+    'decode': (lambda: set_decode(False), lambda: set_decode(True)),
+    'contours': (lambda: set_contour_mode('tree'), lambda: set_contour_mode('fast'))
+}
+
+# Variants that are optimizations only and must reproduce every feature exactly
+EXACT = {'contours'}
+
+def run_variant(compute, data, configure):
+    configure()
+    start = time.perf_counter()
+    features = compute(data)
+    return features, time.perf_counter() - start
+
+def summarize(pairs, seconds):
+    """Drift statistics over (baseline, variant) feature dict pairs"""
+    summary = {
+        'images': len(pairs),
+        'identical': sum(1 for baseline, variant in pairs if baseline == variant),
+        'baseline_ms': round(seconds[0] * 1000, 3),
+        'variant_ms': round(seconds[1] * 1000, 3),
+        'features': {}
+    }
+    if not pairs:
+        return summary
+
+    for key in pairs[0][0]:
+        if key in CATEGORICAL:
+            agree = sum(1 for baseline, variant in pairs if baseline[key] == variant[key])
+            summary['features'][key] = {'agreement': round(agree / len(pairs), 4)}
+            continue
+        drift = [abs(float(variant[key]) - float(baseline[key])) for baseline, variant in pairs]
+        relative = [d / abs(float(baseline[key])) for d, (baseline, _) in zip(drift, pairs) if baseline[key]]
+        summary['features'][key] = {
+            'mean_abs': round(sum(drift) / len(drift), 6),
+            'max_abs': round(max(drift), 6),
+            'mean_rel': round(sum(relative) / len(relative), 6) if relative else 0.0
+        }
+    return summary
+
+def compare(variant, files, pipeline):
+    baseline_config, variant_config = VARIANTS[variant]
+    report = {'variant': variant, 'pipelines': {}, 'errors': []}
+
+    for name, compute in extractors(pipeline):
+        pairs, seconds = [], [0.0, 0.0]
+        for path in files:
+            data = imaging.read_image_bytes(path)
+            try:
+                baseline, base_seconds = run_variant(compute, data, baseline_config)
+                changed, variant_seconds = run_variant(compute, data, variant_config)
+            except Exception as e:
+                report['errors'].append({'pipeline': name, 'image': path, 'message': str(e)})
+                continue
+            pairs.append((baseline, changed))
+            seconds[0] += base_seconds
+            seconds[1] += variant_seconds
+        report['pipelines'][name] = summarize(pairs, seconds)
+
+    baseline_config()
+    if variant in EXACT:
+        report['identical'] = not report['errors'] and all(
+            summary['identical'] == summary['images'] for summary in report['pipelines'].values()
+        )
+    return report
+
+def main(argv):
+    args = list(argv)
+    if not args or args[0] not in VARIANTS:
+        raise ValueError(USAGE)
+    variant = args.pop(0)
+    options = {'--pipeline': 'all', '--synthetic': '0'}
+    while args[:1] and args[0] in options:
+        if len(args) < 2:
+            raise ValueError(USAGE)
+        options[args[0]] = args[1]
+        args = args[2:]
+    if options['--pipeline'] not in ('basic', 'full', 'all'):
+        raise ValueError(USAGE)
+
+    with tempfile.TemporaryDirectory(prefix='dmit_equivalence_') as workdir:
+        files = corpus_files(args)
+        if int(options['--synthetic']):
+            import benchmark
+            for payload in benchmark.make_corpus(workdir, int(options['--synthetic'])):
+                files += list(payload['fingerprints'].values())
+        if not files:
+            raise ValueError(USAGE)
+        report = compare(variant, files, options['--pipeline'])
+
+    print(json.dumps(report, indent=2))
+    return report
+
+if __name__ == '__main__':
+    try:
+        report = main(sys.argv[1:])
+    except Exception as e:
+        print(json.dumps({"status": "error", "message": str(e)}))
+        sys.exit(1)
+    if report.get('identical') is False:
+        sys.exit(1)
@@ -0,0 +1,197 @@
+"""
+Columnar export of scored tests.
+
+Reads the NDJSON reports written by rescore.py (or the --stream mode of the
+pipelines) and writes them as one typed Parquet or Arrow IPC file. The
+JSON-encoded report fields become real columns:
+
+    disc_profile, mi_distribution, ocean_traits, eq_breakdown,
+    pattern_distribution                one numeric column per key
+                                        (disc_d, mi_logical, ocean_openness, ...)
+    swot_analysis, career_recommendations
+                                        one list<string> column per key
+                                        (swot_strengths, career_primary, ...)
+    ocean_description                   list<string>
+
+Every other report field keeps its name with an explicit type; error
+results are skipped and counted. Rows are converted and written one row
+group at a time, so memory is bounded by --row-group whatever the input
+size. Needs pyarrow (pip install pyarrow), which the analysis itself does
+not.
+
+    python export_reports.py --input results.ndjson --output results.parquet
+        [--pipeline full|basic] [--format parquet|arrow] [--row-group N]
+
+--input - reads standard input.
+"""
+import sys
+import json
+
+USAGE = ("Usage: python export_reports.py --input <ndjson|-> --output <path> [--pipeline full|basic] "
+         "[--format parquet|arrow] [--row-group N]")
+
+# (field, arrow type) of the report fields copied as they are
+SCALARS = {
+    'basic': [
+        ('test_id', 'int64'), ('personality_type', 'string'), ('learning_style', 'string'),
+        ('brain_dominance', 'string'), ('holland_code', 'string'),
+        ('logical_mathematical', 'float64'), ('verbal_linguistic', 'float64'), ('naturalistic', 'float64'),
+        ('visual_spatial', 'float64'), ('bodily_kinesthetic', 'float64'), ('musical', 'float64'),
+        ('interpersonal', 'float64'), ('intrapersonal', 'float64'),
+        ('sensing_capability', 'string'), ('thought_process', 'string'), ('psychological_capability', 'string'),
+        ('tfrc', 'int64'), ('atd_angle', 'float64'), ('learning_sensibility', 'int64'),
+        ('leadership_style', 'string'), ('accuracy', 'float64')
+    ],
+    'full': [
+        ('test_id', 'int64'), ('personality_type', 'string'), ('learning_style', 'string'),
+        ('brain_dominance', 'string'), ('holland_code', 'string'),
+        ('sensing_capability', 'string'), ('thought_process', 'string'), ('psychological_capability', 'string'),
+        ('leadership_style', 'string'), ('grit_score', 'float64'), ('aq_score', 'float64'), ('eq_score', 'float64'),
+        ('emotional_regulation', 'float64'), ('flow_state_score', 'float64'), ('cognitive_load_index', 'float64'),
+        ('accuracy', 'float64'), ('tfrc', 'int64'), ('ridge_density', 'float64'), ('atd_angle', 'float64'),
+        ('core_delta_ratio', 'float64')
+    ]
+}
+
+# JSON object fields: field -> (column prefix, value type, keys)
+NESTED = {
+    'basic': {
+        'disc_profile': ('disc', 'float64', ['D', 'I', 'S', 'C']),
+        'mi_distribution': ('mi', 'float64', ['linguistic', 'logical', 'spatial', 'musical', 'bodily',
+                                               'interpersonal', 'intrapersonal', 'naturalist']),
+        'swot_analysis': ('swot', 'list<string>', ['strengths', 'weaknesses', 'opportunities', 'threats']),
+        'career_recommendations': ('career', 'list<string>', ['Primary', 'Secondary', 'Tertiary'])
+    },
+    'full': {
+        'disc_profile': ('disc', 'float64', ['D', 'I', 'S', 'C']),
+        'mi_distribution': ('mi', 'float64', ['Logical', 'Linguistic', 'Naturalistic', 'Spatial', 'Kinesthetic',
+                                               'Musical', 'Interpersonal', 'Intrapersonal']),
+        'ocean_traits': ('ocean', 'float64', ['Openness', 'Conscientiousness', 'Extraversion', 'Agreeableness',
+                                              'Neuroticism']),
+        'eq_breakdown': ('eq', 'float64', ['self_awareness', 'emotional_control', 'social_skills', 'empathy',
+                                           'motivation']),
+        'pattern_distribution': ('pattern', 'int64', ['loops', 'whorls', 'arches']),
+        'swot_analysis': ('swot', 'list<string>', ['strengths', 'weaknesses', 'opportunities', 'threats']),
+        'career_recommendations': ('career', 'list<string>', ['primary', 'secondary', 'tertiary'])
+    }
+}
+
+# JSON array fields kept as one list column
+LISTS = {
+    'basic': [],
+    'full': [('ocean_description', 'list<string>')]
+}
+
+CASTS = {
+    'int64': int,
+    'float64': float,
+    'string': str,
+    'list<string>': lambda values: [str(value) for value in values]
+}
+
+def columns(pipeline):
+    """(column, type) of the export schema of a pipeline, in file order"""
+    schema = list(SCALARS[pipeline])
+    for prefix, kind, keys in NESTED[pipeline].values():
+        schema += [(f'{prefix}_{key.lower()}', kind) for key in keys]
+    return schema + LISTS[pipeline]
+
+def flatten(report, pipeline):
+    """Column values of one successful report; missing fields become None"""
+    row = {}
+    for field, kind in SCALARS[pipeline] + LISTS[pipeline]:
+        value = report.get(field)
+        if isinstance(value, str) and kind == 'list<string>':
+            value = json.loads(value)
+        row[field] = None if value is None else CASTS[kind](value)
+    for field, (prefix, kind, keys) in NESTED[pipeline].items():
+        value = report.get(field)
+        nested = json.loads(value) if isinstance(value, str) else value or {}
+        for key in keys:
+            row[f'{prefix}_{key.lower()}'] = None if nested.get(key) is None else CASTS[kind](nested[key])
+    return row
+
+def read_reports(stream):
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+def row_groups(reports, pipeline, size, counts):
+    """Yield {column: [values]} of up to size successful reports; counts exported and skipped rows"""
+    names = [name for name, _ in columns(pipeline)]
+    group = {name: [] for name in names}
+    filled = 0
+    for report in reports:
+        if not report.get('success'):
+            counts['skipped'] += 1
+            continue
+        row = flatten(report, pipeline)
+        for name in names:
+            group[name].append(row[name])
+        filled += 1
+        counts['rows'] += 1
+        if filled == size:
+            yield group
+            group, filled = {name: [] for name in names}, 0
+    if filled:
+        yield group
+
+def arrow_schema(pipeline):
+    import pyarrow as pa
+    types = {'int64': pa.int64(), 'float64': pa.float64(), 'string': pa.string(), 'list<string>': pa.list_(pa.string())}
+    return pa.schema([(name, types[kind]) for name, kind in columns(pipeline)])
+
+def export(reports, output, pipeline, file_format, size):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise RuntimeError("Columnar export needs pyarrow: pip install pyarrow")
+
+    schema = arrow_schema(pipeline)
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(output, schema, compression='zstd')
+        write = writer.write_table
+        convert = pa.Table.from_pydict
+    else:
+        writer = pa.ipc.new_file(output, schema)
+        write = writer.write_batch
+        convert = pa.RecordBatch.from_pydict
+
+    counts = {'rows': 0, 'skipped': 0, 'row_groups': 0}
+    try:
+        for group in row_groups(reports, pipeline, size, counts):
+            write(convert(group, schema=schema))
+            counts['row_groups'] += 1
+    finally:
+        writer.close()
+    return counts
+
+def main(argv):
+    options = {'--input': None, '--output': None, '--pipeline': 'full', '--format': 'parquet', '--row-group': '65536'}
+    args = list(argv)
+    while args:
+        flag = args.pop(0)
+        if flag not in options or not args:
+            raise ValueError(USAGE)
+        options[flag] = args.pop(0)
+    if not options['--input'] or not options['--output']:
+        raise ValueError(USAGE)
+    if options['--pipeline'] not in SCALARS or options['--format'] not in ('parquet', 'arrow'):
+        raise ValueError(USAGE)
+
+    stream = sys.stdin if options['--input'] == '-' else open(options['--input'])
+    try:
+        counts = export(read_reports(stream), options['--output'], options['--pipeline'],
+                        options['--format'], int(options['--row-group']))
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    print(json.dumps(dict(counts, output=options['--output'])))
+
+if __name__ == '__main__':
+    try:
+        main(sys.argv[1:])
+    except Exception as e:
+        print(json.dumps({"status": "error", "message": str(e)}))
+        sys.exit(1)
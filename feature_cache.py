@@ -0,0 +1,230 @@
+"""
+Content-addressed cache for per-finger fingerprint features.
+
+Entries are keyed by the SHA-256 of the image bytes plus the extractor
+version, so a re-uploaded or re-scored image skips decoding and contour
+analysis entirely. Lookups go through an in-memory LRU first, then an
+optional SQLite file that is trimmed to a size budget (least recently used
+rows first).
+
+    DMIT_FEATURE_CACHE_ITEMS  in-memory entries (default 1024, 0 disables)
+    DMIT_FEATURE_CACHE_DIR    directory of the on-disk tier (unset disables)
+    DMIT_FEATURE_CACHE_MB     on-disk size budget (default 256)
+
+    python feature_cache.py stats   prints the hit/miss counters of the disk tier
+
+Counters are kept in memory and added to the disk tier every
+COUNTER_FLUSH_EVENTS events, every COUNTER_FLUSH_SECONDS and at exit, so
+a memory hit never writes to SQLite; stats may lag running processes by
+that much.
+"""
+import sys
+import json
+import atexit
+import os
+import math
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+CACHE_ITEMS = int(os.environ.get('DMIT_FEATURE_CACHE_ITEMS', 1024))
+CACHE_DIR = os.environ.get('DMIT_FEATURE_CACHE_DIR')
+CACHE_MB = float(os.environ.get('DMIT_FEATURE_CACHE_MB', 256))
+CACHE_FILE = 'feature_cache.sqlite'
+
+COUNTERS = ['memory_hits', 'disk_hits', 'misses', 'evictions']
+COUNTER_FLUSH_EVENTS = 100
+COUNTER_FLUSH_SECONDS = 5.0
+
+class DiskTier:
+    """SQLite-backed tier shared by every process on the box"""
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.local = threading.local()
+        db = self.connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("CREATE TABLE IF NOT EXISTS features (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS features_accessed ON features (accessed)")
+            db.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            db.executemany("INSERT OR IGNORE INTO counters VALUES (?, 0)", [(name,) for name in COUNTERS])
+            # Running entry count and byte total, kept by triggers so puts never scan the table
+            db.execute("CREATE TABLE IF NOT EXISTS totals (entries INTEGER NOT NULL, bytes INTEGER NOT NULL)")
+            if db.execute("SELECT COUNT(*) FROM totals").fetchone()[0] == 0:
+                db.execute("INSERT INTO totals SELECT COUNT(*), COALESCE(SUM(size), 0) FROM features")
+            db.execute("CREATE TRIGGER IF NOT EXISTS features_insert AFTER INSERT ON features BEGIN "
+                       "UPDATE totals SET entries = entries + 1, bytes = bytes + new.size; END")
+            db.execute("CREATE TRIGGER IF NOT EXISTS features_update AFTER UPDATE OF size ON features BEGIN "
+                       "UPDATE totals SET bytes = bytes + new.size - old.size; END")
+            db.execute("CREATE TRIGGER IF NOT EXISTS features_delete AFTER DELETE ON features BEGIN "
+                       "UPDATE totals SET entries = entries - 1, bytes = bytes - old.size; END")
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def connection(self):
+        if not hasattr(self.local, 'db'):
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db = db
+        return self.local.db
+
+    def get(self, key):
+        db = self.connection()
+        row = db.execute("SELECT value FROM features WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        db.execute("UPDATE features SET accessed = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, features):
+        value = json.dumps(features)
+        db = self.connection()
+        # An upsert rather than REPLACE, so the update trigger sees the old size
+        db.execute(
+            "INSERT INTO features VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+            "value = excluded.value, size = excluded.size, accessed = excluded.accessed",
+            (key, value, len(value), time.time())
+        )
+        return self.evict()
+
+    def evict(self):
+        """Drop least recently used rows until the tier fits its budget"""
+        db = self.connection()
+        removed = 0
+        while True:
+            entries, total = db.execute("SELECT entries, bytes FROM totals").fetchone()
+            if total <= self.max_bytes or not entries:
+                return removed
+            # Rows of average size that bring the tier down to 90% of its budget
+            count = max(1, math.ceil((total - self.max_bytes * 0.9) * entries / total))
+            removed += db.execute(
+                "DELETE FROM features WHERE key IN (SELECT key FROM features ORDER BY accessed LIMIT ?)", (count,)
+            ).rowcount
+
+    def count(self, amounts):
+        """Add {name: amount} to the shared counters in one transaction"""
+        db = self.connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany("UPDATE counters SET value = value + ? WHERE name = ?",
+                           [(amount, name) for name, amount in amounts.items() if amount])
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def counters(self):
+        return dict(self.connection().execute("SELECT name, value FROM counters").fetchall())
+
+class FeatureCache:
+    """Two-tier feature cache with hit/miss counters"""
+
+    def __init__(self, memory_items=CACHE_ITEMS, disk_dir=CACHE_DIR, disk_mb=CACHE_MB):
+        self.memory_items = memory_items
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.unflushed = dict.fromkeys(COUNTERS, 0)
+        self.flushed_at = time.monotonic()
+        self.disk = None
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self.disk = DiskTier(os.path.join(disk_dir, CACHE_FILE), disk_mb * 1024 * 1024)
+            atexit.register(self.flush)
+
+    @staticmethod
+    def make_key(data, version):
+        return f"{version}:{hashlib.sha256(data).hexdigest()}"
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+            self.unflushed[name] += amount
+            due = (sum(self.unflushed.values()) >= COUNTER_FLUSH_EVENTS
+                   or time.monotonic() - self.flushed_at >= COUNTER_FLUSH_SECONDS)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Add the counts since the last flush to the disk tier"""
+        with self.lock:
+            amounts, self.unflushed = self.unflushed, dict.fromkeys(COUNTERS, 0)
+            self.flushed_at = time.monotonic()
+        if self.disk is not None and any(amounts.values()):
+            self.disk.count(amounts)
+
+    def remember(self, key, features):
+        if self.memory_items <= 0:
+            return
+        with self.lock:
+            self.memory[key] = features
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_items:
+                self.memory.popitem(last=False)
+
+    def get(self, key):
+        with self.lock:
+            features = self.memory.get(key)
+            if features is not None:
+                self.memory.move_to_end(key)
+        if features is not None:
+            self.count('memory_hits')
+            return dict(features)
+
+        if self.disk is not None:
+            features = self.disk.get(key)
+            if features is not None:
+                self.count('disk_hits')
+                self.remember(key, features)
+                return dict(features)
+
+        self.count('misses')
+        return None
+
+    def put(self, key, features):
+        self.remember(key, dict(features))
+        if self.disk is not None:
+            self.count('evictions', self.disk.put(key, features))
+
+    def get_or_compute(self, data, version, compute):
+        """Return cached features for the image bytes, computing them on a miss"""
+        key = self.make_key(data, version)
+        features = self.get(key)
+        if features is None:
+            features = compute()
+            self.put(key, features)
+        return features
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters, memory_items=len(self.memory))
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Process-wide cache configured from the environment"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = FeatureCache()
+        return _cache
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'stats' or not CACHE_DIR:
+        print("Usage: DMIT_FEATURE_CACHE_DIR=<dir> python feature_cache.py stats")
+        sys.exit(1)
+    disk = DiskTier(os.path.join(CACHE_DIR, CACHE_FILE), CACHE_MB * 1024 * 1024)
+    counters = disk.counters()
+    entries, size = disk.connection().execute("SELECT entries, bytes FROM totals").fetchone()
+    print(json.dumps(dict(counters, entries=entries, bytes=size)))
@@ -0,0 +1,291 @@
+"""
+Array-based inference engine for the trained RandomForest models.
+
+Every tree of every model is flattened into shared NumPy node arrays
+(feature, threshold, left/right child, per-model leaf values). All trees
+are then walked together, one level per step, so one call returns class
+labels, class probabilities and regression outputs for every model without
+touching scikit-learn.
+
+The compiled set is stored as plain .npy files (compiled_models/ in the
+model directory) and memory-mapped read-only on load, so concurrent worker
+processes share a single copy of the node arrays.
+
+Leaves point to themselves, so walking max_depth levels always ends on a
+leaf. Inputs are cast to float32 and compared against float64 thresholds
+exactly like sklearn's tree code, and tree outputs are summed in estimator
+order, so predictions match the source forests. Sets written by
+compress_models.py use narrower dtypes (int16 nodes, float32 thresholds
+and values) and load the same way. Each set records the version of the
+models.bundle it was compiled from ('source', None for pickle-only
+directories); a set whose source is not the current bundle is skipped, so
+a crash between writing the bundle and the compiled set, or a bundle
+packed by hand, never mixes old compiled models with new bundled ones.
+
+    python forest_engine.py <model_dir> <name> [<name> ...]
+
+compiles the named models of a model directory (its models.bundle, or the
+trained_model_<name>.pkl files).
+"""
+import sys
+import json
+import os
+import shutil
+import hashlib
+import numpy as np
+import model_bundle
+
+COMPILED_DIR = 'compiled_models'
+MANIFEST_FILE = 'manifest.json'
+
+def compile_forest(estimator):
+    """Flatten a fitted RandomForest into local node arrays"""
+    is_classifier = hasattr(estimator, 'classes_')
+    feature, threshold, left, right, values, tree_nodes, depths = [], [], [], [], [], [], []
+
+    for tree in estimator.estimators_:
+        t = tree.tree_
+        n_nodes = t.node_count
+        index = np.arange(n_nodes, dtype=np.int32)
+        is_leaf = t.children_left == -1
+
+        feature.append(np.where(is_leaf, 0, t.feature).astype(np.int32))
+        threshold.append(np.where(is_leaf, 0.0, t.threshold).astype(np.float64))
+        left.append(np.where(is_leaf, index, t.children_left).astype(np.int32))
+        right.append(np.where(is_leaf, index, t.children_right).astype(np.int32))
+
+        if is_classifier:
+            proba = t.value[:, 0, :estimator.n_classes_].astype(np.float64)
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(proba / normalizer)
+        else:
+            values.append(t.value[:, :, 0].astype(np.float64))
+
+        tree_nodes.append(n_nodes)
+        depths.append(t.max_depth)
+
+    return {
+        'kind': 'classifier' if is_classifier else 'regressor',
+        'classes': estimator.classes_.tolist() if is_classifier else None,
+        'n_features': int(estimator.n_features_in_),
+        'n_outputs': int(estimator.n_outputs_),
+        'feature': np.concatenate(feature),
+        'threshold': np.concatenate(threshold),
+        'left': np.concatenate(left),
+        'right': np.concatenate(right),
+        'values': np.concatenate(values),
+        'tree_nodes': np.array(tree_nodes, dtype=np.int64),
+        'max_depth': int(max(depths))
+    }
+
+def compile_models(models, source=None):
+    """Compile a dict of fitted forests into the (meta, arrays) of one model set"""
+    return assemble_models({name: compile_forest(model) for name, model in models.items()}, source)
+
+def assemble_models(compiled_models, source=None):
+    """(meta, arrays) of one model set from compile_forest() outputs by name; source is the bundle version"""
+    arrays = {}
+    meta = {'models': [], 'source': source}
+    feature, threshold, left, right, tree_offset = [], [], [], [], []
+    node_base = 0
+    tree_base = 0
+
+    for name, compiled in compiled_models.items():
+        tree_nodes = compiled['tree_nodes']
+        feature.append(compiled['feature'])
+        threshold.append(compiled['threshold'])
+        left.append(compiled['left'])
+        right.append(compiled['right'])
+        tree_offset.append(np.concatenate([[0], np.cumsum(tree_nodes)[:-1]]) + node_base)
+        arrays[f'values__{name}'] = compiled['values']
+
+        meta['models'].append({
+            'name': name,
+            'kind': compiled['kind'],
+            'classes': compiled['classes'],
+            'n_features': compiled['n_features'],
+            'n_outputs': compiled['n_outputs'],
+            'max_depth': compiled['max_depth'],
+            'trees': [tree_base, tree_base + len(tree_nodes)],
+            'node_base': node_base
+        })
+        node_base += int(tree_nodes.sum())
+        tree_base += len(tree_nodes)
+
+    arrays['feature'] = np.concatenate(feature)
+    arrays['threshold'] = np.concatenate(threshold)
+    arrays['left'] = np.concatenate(left)
+    arrays['right'] = np.concatenate(right)
+    arrays['tree_offset'] = np.concatenate(tree_offset).astype(np.int64)
+    meta['max_depth'] = max(spec['max_depth'] for spec in meta['models'])
+
+    digest = hashlib.sha256(json.dumps(meta, sort_keys=True).encode())
+    for key in sorted(arrays):
+        digest.update(key.encode())
+        digest.update(np.ascontiguousarray(arrays[key]).tobytes())
+    meta['version'] = digest.hexdigest()[:16]
+    return meta, arrays
+
+def save_compiled(models, model_dir, source=None):
+    """
+    Compile a dict of fitted forests into model_dir/compiled_models;
+    source is the version of the bundle they were written to.
+    Each set is written to a temporary directory that is renamed to its
+    versioned name, and the compiled_models symlink is swapped atomically,
+    so running workers keep their mapped arrays and new workers only ever
+    see a complete set. Re-exporting an unchanged set only re-points the
+    link.
+    """
+    return save_model_set(*compile_models(models, source), model_dir)
+
+def save_model_set(meta, arrays, model_dir):
+    """Write an assembled model set to a versioned directory and swap the compiled_models link"""
+    version_dir = os.path.join(model_dir, f"{COMPILED_DIR}-{meta['version']}")
+    # The version is a content hash: an existing directory already holds this set and
+    # may be mapped by running workers, so it is never rewritten in place
+    if not os.path.exists(os.path.join(version_dir, MANIFEST_FILE)):
+        tmp_dir = f'{version_dir}.{os.getpid()}.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for key, array in arrays.items():
+            np.save(os.path.join(tmp_dir, f'{key}.npy'), np.ascontiguousarray(array))
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w') as f:
+            json.dump(meta, f, indent=2)
+        # Left over from an interrupted export before the manifest was written
+        shutil.rmtree(version_dir, ignore_errors=True)
+        os.rename(tmp_dir, version_dir)
+
+    link = os.path.join(model_dir, COMPILED_DIR)
+    previous = os.path.realpath(link) if os.path.islink(link) else None
+    tmp_link = f'{link}.{os.getpid()}.tmp'
+    os.symlink(os.path.basename(version_dir), tmp_link)
+    os.replace(tmp_link, link)
+
+    # Mapped files stay valid for running workers after unlinking
+    if previous and previous != os.path.realpath(version_dir):
+        shutil.rmtree(previous, ignore_errors=True)
+
+    return version_dir
+
+class CompiledModelSet:
+    """All compiled forests of one model directory, evaluated in a single pass"""
+
+    def __init__(self, meta, arrays):
+        self.version = meta.get('version')
+        self.source = meta.get('source')
+        self.max_depth = meta['max_depth']
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.tree_offset = arrays['tree_offset']
+        self.specs = {}
+        for spec in meta['models']:
+            self.specs[spec['name']] = dict(
+                spec,
+                values=arrays[f"values__{spec['name']}"],
+                classes=np.array(spec['classes']) if spec['classes'] is not None else None
+            )
+
+    def __contains__(self, name):
+        return name in self.specs
+
+    def __iter__(self):
+        return iter(self.specs)
+
+    def keys(self):
+        return self.specs.keys()
+
+    def apply(self, X, tree_index=None, depth=None):
+        """Return the global leaf index reached by each tree for each row"""
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(X.shape[0])
+        offsets = self.tree_offset if tree_index is None else self.tree_offset[tree_index]
+        node = np.broadcast_to(offsets[:, np.newaxis], (len(offsets), X.shape[0]))
+
+        for _ in range(self.max_depth if depth is None else depth):
+            feature = self.feature[node]
+            go_left = X[rows, feature] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node]) + offsets[:, np.newaxis]
+
+        return node
+
+    def predict(self, X, names=None):
+        """Evaluate the named models (default: all) on X in one pass"""
+        names = list(self.specs) if names is None else list(names)
+        X = np.asarray(X)
+        for name in names:
+            if X.shape[1] != self.specs[name]['n_features']:
+                raise ValueError(f"{name} model expects {self.specs[name]['n_features']} features, got {X.shape[1]}")
+
+        tree_index = np.concatenate([np.arange(*self.specs[name]['trees']) for name in names])
+        leaves = self.apply(X, tree_index, max(self.specs[name]['max_depth'] for name in names))
+
+        outputs = {}
+        position = 0
+        for name in names:
+            spec = self.specs[name]
+            n_trees = spec['trees'][1] - spec['trees'][0]
+            model_leaves = leaves[position:position + n_trees] - spec['node_base']
+            position += n_trees
+
+            mean = np.add.reduce(spec['values'][model_leaves], axis=0, dtype=np.float64) / n_trees
+            if spec['kind'] == 'classifier':
+                outputs[name] = {'value': spec['classes'][np.argmax(mean, axis=1)], 'proba': mean}
+            else:
+                outputs[name] = {'value': mean[:, 0] if spec['n_outputs'] == 1 else mean, 'proba': None}
+
+        return outputs
+
+def load_compiled(path, mmap_mode='r'):
+    """
+    Load a compiled model set directory. With mmap_mode='r' the node arrays
+    are mapped read-only, so every worker process shares one copy through
+    the page cache and loading costs a few small reads.
+    """
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        meta = json.load(f)
+    keys = ['feature', 'threshold', 'left', 'right', 'tree_offset'] + [f"values__{spec['name']}" for spec in meta['models']]
+    arrays = {key: np.load(os.path.join(path, f'{key}.npy'), mmap_mode=mmap_mode) for key in keys}
+    return CompiledModelSet(meta, arrays)
+
+def load_if_available(model_dir, names):
+    """Return the compiled model set of model_dir if it covers every name and matches its bundle"""
+    path = os.path.join(model_dir, COMPILED_DIR)
+    if not os.path.exists(os.path.join(path, MANIFEST_FILE)):
+        return None
+    models = load_compiled(os.path.realpath(path))
+    if not all(name in models for name in names):
+        return None
+    if models.source != model_bundle.bundle_version(model_dir):
+        return None
+    return models
+
+def predict_models(models, X, names=None):
+    """
+    Evaluate models on X and return {name: {'value': ..., 'proba': ...}}.
+    Works for a CompiledModelSet or a dict of sklearn forests; classifiers
+    are only walked once, labels are derived from their probabilities.
+    """
+    if isinstance(models, CompiledModelSet):
+        return models.predict(X, names)
+
+    outputs = {}
+    for name in (names if names is not None else models.keys()):
+        model = models[name]
+        if hasattr(model, 'predict_proba'):
+            proba = model.predict_proba(X)
+            outputs[name] = {'value': model.classes_.take(np.argmax(proba, axis=1), axis=0), 'proba': proba}
+        else:
+            outputs[name] = {'value': model.predict(X), 'proba': None}
+    return outputs
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print("Usage: python forest_engine.py <model_dir> <name> [<name> ...]")
+        sys.exit(1)
+
+    model_dir = sys.argv[1]
+    models = model_bundle.load_models(model_dir, sys.argv[2:])
+    print(f"Compiled {len(models)} models into {save_compiled(models, model_dir, model_bundle.bundle_version(model_dir))}")
@@ -0,0 +1,80 @@
+"""
+Length-prefixed binary framing of whole tests.
+
+Lets a caller hand the 10 encoded fingerprint images of a test straight to
+the analysis, on stdin or a daemon socket, without a temp JSON file and a
+filesystem round-trip per image. All integers are big-endian:
+
+    magic      4 bytes  b'DMIT'
+    version    uint8    1
+    test_id    int64
+    count      uint16   number of images
+    count times:
+        name   uint16 length + UTF-8 finger name (e.g. right_thumb)
+        image  uint32 length + encoded image bytes (JPEG, PNG, ...)
+
+A frame decodes to the usual payload, {'test_id': ..., 'fingerprints':
+{name: bytes}}; the extractors decode bytes values from memory. Frames can
+follow each other on one stream; each is answered with one report line.
+"""
+import struct
+
+MAGIC = b'DMIT'
+VERSION = 1
+
+HEADER = struct.Struct('>4sBqH')
+NAME_LENGTH = struct.Struct('>H')
+IMAGE_LENGTH = struct.Struct('>I')
+
+# Upper bound for one image, so a corrupt length cannot exhaust memory
+MAX_IMAGE_BYTES = 64 * 1024 * 1024
+
+def encode_frame(test_id, fingerprints):
+    """Frame of a test from {finger name: encoded image bytes}"""
+    parts = [HEADER.pack(MAGIC, VERSION, test_id, len(fingerprints))]
+    for name, data in fingerprints.items():
+        name = name.encode('utf-8')
+        parts += [NAME_LENGTH.pack(len(name)), name, IMAGE_LENGTH.pack(len(data)), data]
+    return b''.join(parts)
+
+def write_frame(stream, test_id, fingerprints):
+    stream.write(encode_frame(test_id, fingerprints))
+    stream.flush()
+
+def read_exact(stream, size):
+    data = stream.read(size)
+    if data is None or len(data) != size:
+        raise ValueError("Truncated frame")
+    return data
+
+def read_frame(stream):
+    """Next payload from a binary stream, None at a clean end of stream"""
+    head = stream.read(HEADER.size)
+    if not head:
+        return None
+    if len(head) != HEADER.size:
+        raise ValueError("Truncated frame")
+
+    magic, version, test_id, count = HEADER.unpack(head)
+    if magic != MAGIC:
+        raise ValueError("Invalid frame: bad magic")
+    if version != VERSION:
+        raise ValueError(f"Unsupported frame version: {version}")
+
+    fingerprints = {}
+    for _ in range(count):
+        name_length, = NAME_LENGTH.unpack(read_exact(stream, NAME_LENGTH.size))
+        name = read_exact(stream, name_length).decode('utf-8')
+        image_length, = IMAGE_LENGTH.unpack(read_exact(stream, IMAGE_LENGTH.size))
+        if image_length > MAX_IMAGE_BYTES:
+            raise ValueError(f"Image too large in frame: {name}")
+        fingerprints[name] = read_exact(stream, image_length)
+    return {'test_id': test_id, 'fingerprints': fingerprints}
+
+def read_frames(stream):
+    """Yield every payload of a binary stream"""
+    while True:
+        payload = read_frame(stream)
+        if payload is None:
+            return
+        yield payload
@@ -2,91 +2,135 @@
 import sys
 import json
 import os
-import cv2
-import numpy as np
 import math
-import joblib
+import startup
+
+# Heavy modules are imported on first use; see startup.py
+cv2 = startup.lazy_import('cv2')
+np = startup.lazy_import('numpy')
+forest_engine = startup.lazy_import('forest_engine')
+extraction_pool = startup.lazy_import('extraction_pool')
+feature_cache = startup.lazy_import('feature_cache')
+model_bundle = startup.lazy_import('model_bundle')
+prediction_cache = startup.lazy_import('prediction_cache')
+imaging = startup.lazy_import('imaging')
+quality_gate = startup.lazy_import('quality_gate')
+metrics = startup.lazy_import('metrics')
+framing = startup.lazy_import('framing')
 
 MODEL_DIR = os.path.join('/var/www/dmittest/public/ai_models')
 
+# Bump whenever extract_features changes its output
+FEATURE_VERSION = 'full-1'
+
 # --- Load Models ---
-def load_models():
-    model_files = {
-        'personality': 'trained_model_personality.pkl',
-        'disc': 'trained_model_disc.pkl',
-        'learning': 'trained_model_learning.pkl',
-        'holland': 'trained_model_holland.pkl',
-        'mi': 'trained_model_mi.pkl',
-        'sensing': 'trained_model_sensing.pkl',
-        'thought': 'trained_model_thought.pkl',
-        'psych': 'trained_model_psych.pkl',
-        'leadership': 'trained_model_leadership.pkl',
-        'ocean': 'trained_model_ocean.pkl',
-        'grit': 'trained_model_grit.pkl',
-        'aq': 'trained_model_aq.pkl',
-        'eq': 'trained_model_eq.pkl',
-        'emotional_regulation': 'trained_model_emotional_regulation.pkl',
-        'flow_state': 'trained_model_flow_state.pkl',
-        'cognitive_load': 'trained_model_cognitive_load.pkl'
-    }
-    models = {}
-    for name, file in model_files.items():
-        path = os.path.join(MODEL_DIR, file)
-        models[name] = joblib.load(path)
-    return models
+def load_models(names=None):
+    """Load the named models (default: all)"""
+    names = MODEL_NAMES if names is None else names
+    compiled = forest_engine.load_if_available(MODEL_DIR, names)
+    if compiled is not None:
+        return compiled
+    return model_bundle.load_models(MODEL_DIR, names)
 
 def extract_features(image_input):
     """
     Extracts fingerprint features from either an image file path or raw bytes.
-    Returns a dictionary of computed metrics.
+    Returns a dictionary of computed metrics. Results are cached by the hash
+    of the image bytes, so a known image is never decoded twice.
     """
+    data = imaging.read_image_bytes(image_input)
+    if data is None:
+        raise ValueError("Failed to load image from input")
 
-    # Determine input type: bytes or file path
-    if isinstance(image_input, bytes):
-        img_array = np.frombuffer(image_input, np.uint8)
-        img = cv2.imdecode(img_array, cv2.IMREAD_GRAYSCALE)
-    else:
-        img = cv2.imread(image_input, cv2.IMREAD_GRAYSCALE)
+    return feature_cache.get_cache().get_or_compute(
+        data, FEATURE_VERSION + imaging.decode_variant(), lambda: compute_features(data)
+    )
 
+def compute_features(data):
+    """Computes the features of one encoded fingerprint image."""
+    img = imaging.load_resized(data)
     if img is None:
         raise ValueError("Failed to load image from input")
+    return features_from_images([img])[0]
 
-    img = cv2.resize(img, (500, 500))
-    _, thresh = cv2.threshold(img, 127, 255, cv2.THRESH_BINARY)
-
-    contours, _ = cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-    ridge_count = len(contours)
-    ridge_density = ridge_count / 5.0
-
-    moments = cv2.moments(thresh)
-    cx = int(moments['m10'] / moments['m00']) if moments['m00'] != 0 else 250
-    cy = int(moments['m01'] / moments['m00']) if moments['m00'] != 0 else 250
-
-    orientation = math.degrees(math.atan2(cy - 250, cx - 250))
-
-    area = cv2.contourArea(contours[0]) if contours else 0
-    perimeter = cv2.arcLength(contours[0], True) if contours else 1
-    circularity = 4 * math.pi * (area / (perimeter ** 2)) if perimeter != 0 else 0
-
-    core_delta_ratio = 1.0
-    if len(contours) > 1:
-        delta = tuple(contours[1][0][0])
-        core_delta_ratio = math.hypot(cx - delta[0], cy - delta[1]) / 500.0
+def load_fingerprint(image_input):
+    """Cached features of one fingerprint, or (cache key, resized image) on a cache miss."""
+    data = imaging.read_image_bytes(image_input)
+    if data is None:
+        raise ValueError("Failed to load image from input")
 
-    pattern_type = 1 if circularity > 0.75 else 2 if circularity < 0.25 else 0
-    subtype = 'Plain' if pattern_type == 1 else 'Tented' if pattern_type == 2 else ('Radial' if orientation > 0 else 'Ulnar')
+    key = feature_cache.FeatureCache.make_key(data, FEATURE_VERSION + imaging.decode_variant())
+    features = feature_cache.get_cache().get(key)
+    if features is not None:
+        return features
+    img = imaging.load_resized(data)
+    if img is None:
+        raise ValueError("Failed to load image from input")
+    return key, img
 
-    return {
-        'ridge_count': ridge_count,
-        'ridge_density': ridge_density,
-        'orientation': orientation,
-        'pattern_type': pattern_type,
-        'pattern_subtype': subtype,
-        'circularity': circularity,
-        'core_delta_ratio': core_delta_ratio,
-        'intensity_mean': float(np.mean(img)),
-        'intensity_std': float(np.std(img))
-    }
+def extract_test_features(fingerprints):
+    """
+    Extracts the features of all fingers of a test. Cache misses are decoded
+    concurrently and then analyzed as one (N, 500, 500) stack.
+    """
+    features = extraction_pool.extract_all(fingerprints, load_fingerprint)
+    pending = [finger for finger, loaded in features.items() if isinstance(loaded, tuple)]
+    if not pending:
+        return features
+    if quality_gate.ENABLED:
+        with metrics.stage('quality_gate'):
+            quality_gate.check({finger: features[finger][1] for finger in pending})
+
+    computed = features_from_images([features[finger][1] for finger in pending])
+    cache = feature_cache.get_cache()
+    for finger, finger_features in zip(pending, computed):
+        cache.put(features[finger][0], finger_features)
+        features[finger] = finger_features
+    return features
+
+def contour_step(thresh):
+    with metrics.stage('contours'):
+        return imaging.contour_summary(thresh)
+
+def features_from_images(images):
+    """Features of resized fingerprint images; only the contour step runs per image."""
+    stats = imaging.stack_statistics(images)
+    features = []
+    # Contour tracing is the costly per-image step; it runs concurrently on the extraction pool
+    summaries = extraction_pool.map_ordered(contour_step, stats['thresh'])
+    for i, (ridge_count, first_contour, second_start) in enumerate(summaries):
+        ridge_density = ridge_count / 5.0
+
+        m00 = stats['m00'][i]
+        cx = int(stats['m10'][i] / m00) if m00 != 0 else 250
+        cy = int(stats['m01'][i] / m00) if m00 != 0 else 250
+
+        orientation = math.degrees(math.atan2(cy - 250, cx - 250))
+
+        area = cv2.contourArea(first_contour) if ridge_count else 0
+        perimeter = cv2.arcLength(first_contour, True) if ridge_count else 1
+        circularity = 4 * math.pi * (area / (perimeter ** 2)) if perimeter != 0 else 0
+
+        core_delta_ratio = 1.0
+        if ridge_count > 1:
+            delta = tuple(second_start)
+            core_delta_ratio = math.hypot(cx - delta[0], cy - delta[1]) / 500.0
+
+        pattern_type = 1 if circularity > 0.75 else 2 if circularity < 0.25 else 0
+        subtype = 'Plain' if pattern_type == 1 else 'Tented' if pattern_type == 2 else ('Radial' if orientation > 0 else 'Ulnar')
+
+        features.append({
+            'ridge_count': ridge_count,
+            'ridge_density': ridge_density,
+            'orientation': orientation,
+            'pattern_type': pattern_type,
+            'pattern_subtype': subtype,
+            'circularity': circularity,
+            'core_delta_ratio': core_delta_ratio,
+            'intensity_mean': float(stats['mean'][i]),
+            'intensity_std': float(stats['std'][i])
+        })
+    return features
 
 def calculate_composite(features):
     tfrc = sum(f['ridge_count'] for f in features.values())
@@ -229,7 +273,12 @@ def generate_swot(pred):
 
     return swot
 
-def predict(models, features, composite):
+MODEL_NAMES = [
+    'personality', 'disc', 'learning', 'holland', 'mi', 'sensing', 'thought', 'psych',
+    'leadership', 'ocean', 'grit', 'aq', 'eq', 'emotional_regulation', 'flow_state', 'cognitive_load'
+]
+
+def build_feature_row(features, composite):
     X = []
     for key in [
         'right_thumb', 'right_index', 'right_middle', 'right_ring', 'right_pinky',
@@ -237,33 +286,50 @@ def predict(models, features, composite):
         f = features.get(key, {k: 0 for k in range(5)})
         X += [f['ridge_count'], f['pattern_type'], f['circularity'], f['ridge_density'], f['core_delta_ratio']]
     X += [composite['tfrc'], composite['atd_angle'], composite['ridge_density'], composite['core_delta_ratio']]
-    X = np.array([X])
-
-    pred = {
-        'personality_type': models['personality'].predict(X)[0],
-        'disc_scores': models['disc'].predict(X)[0].tolist(),
-        'learning_style': models['learning'].predict(X)[0],
-        'holland_code': models['holland'].predict(X)[0],
-        'mi_scores': models['mi'].predict(X)[0].tolist(),
-        'sensing_capability': models['sensing'].predict(X)[0],
-        'thought_process': models['thought'].predict(X)[0],
-        'psychological_capability': models['psych'].predict(X)[0],
-        'leadership_style': models['leadership'].predict(X)[0],
-        'ocean_traits': models['ocean'].predict(X)[0].tolist(),
-        'grit_score': float(models['grit'].predict(X)[0]),
-        'aq_score': float(models['aq'].predict(X)[0]),
-        'eq_score': float(models['eq'].predict(X)[0]),
-        'emotional_regulation': float(models['emotional_regulation'].predict(X)[0]),
-        'flow_state_score': float(models['flow_state'].predict(X)[0]),
-        'cognitive_load_index': float(models['cognitive_load'].predict(X)[0]),
-        'composite': composite
-    }
+    return X
+
+# Prediction key of each model output and how to read one row of it
+PREDICTIONS = {
+    'personality': ('personality_type', lambda value: value),
+    'disc': ('disc_scores', lambda value: value.tolist()),
+    'learning': ('learning_style', lambda value: value),
+    'holland': ('holland_code', lambda value: value),
+    'mi': ('mi_scores', lambda value: value.tolist()),
+    'sensing': ('sensing_capability', lambda value: value),
+    'thought': ('thought_process', lambda value: value),
+    'psych': ('psychological_capability', lambda value: value),
+    'leadership': ('leadership_style', lambda value: value),
+    'ocean': ('ocean_traits', lambda value: value.tolist()),
+    'grit': ('grit_score', float),
+    'aq': ('aq_score', float),
+    'eq': ('eq_score', float),
+    'emotional_regulation': ('emotional_regulation', float),
+    'flow_state': ('flow_state_score', float),
+    'cognitive_load': ('cognitive_load_index', float)
+}
+
+def predict(models, features, composite, names=None):
+    return predict_batch(models, [build_feature_row(features, composite)], [composite], names)[0]
+
+def predict_batch(models, rows, composites, names=None):
+    """Run the named models (default: all) once over the stacked feature rows of many tests"""
+    names = MODEL_NAMES if names is None else names
+    outputs = prediction_cache.predict_models(models, np.array(rows), names) if names else {}
+    return [collect_predictions(outputs, i, composite) for i, composite in enumerate(composites)]
+
+def collect_predictions(outputs, i, composite):
+    pred = {}
+    for name, output in outputs.items():
+        key, convert = PREDICTIONS[name]
+        pred[key] = convert(output['value'][i])
+    pred['composite'] = composite
 
     # Accuracy Calculation
-    personality_conf = np.max(models['personality'].predict_proba(X))
-    ridge_quality = min(1.0, composite['ridge_density'] / 15.0)
-    pattern_quality = 1.0 if composite['pattern_distribution']['whorls'] > 3 else 0.8
-    pred['accuracy'] = round((0.6 * personality_conf + 0.2 * ridge_quality + 0.2 * (pred['grit_score'] / 100)) * 100, 2)
+    if 'personality' in outputs and 'grit' in outputs:
+        personality_conf = np.max(outputs['personality']['proba'][i])
+        ridge_quality = min(1.0, composite['ridge_density'] / 15.0)
+        pattern_quality = 1.0 if composite['pattern_distribution']['whorls'] > 3 else 0.8
+        pred['accuracy'] = round((0.6 * personality_conf + 0.2 * ridge_quality + 0.2 * (pred['grit_score'] / 100)) * 100, 2)
 
     return pred
 
@@ -272,84 +338,211 @@ def estimate_brain_dominance(disc_scores, mi_scores):
     right_traits = disc_scores[1] + disc_scores[2] + mi_scores[6] + mi_scores[7]
     return 'Left' if left_traits > right_traits else 'Right' if right_traits > left_traits else 'Balanced'
 
-def build_report(pred):
-    mi_labels = ['Logical', 'Linguistic', 'Naturalistic', 'Spatial', 'Kinesthetic', 'Musical', 'Interpersonal', 'Intrapersonal']
-    mi_dict = dict(zip(mi_labels, map(lambda x: round(x, 1), pred['mi_scores'])))
-    top_mi = sorted(mi_dict.items(), key=lambda x: x[1], reverse=True)[:2]
+MI_LABELS = ['Logical', 'Linguistic', 'Naturalistic', 'Spatial', 'Kinesthetic', 'Musical', 'Interpersonal', 'Intrapersonal']
+
+def mi_distribution(pred):
+    return dict(zip(MI_LABELS, map(lambda x: round(x, 1), pred['mi_scores'])))
+
+def career_recommendations(pred):
+    top_mi = sorted(mi_distribution(pred).items(), key=lambda x: x[1], reverse=True)[:2]
     disc_type = ['D', 'I', 'S', 'C'][np.argmax(pred['disc_scores'])]
+    return get_career_recommendations(pred['holland_code'], [m[0] for m in top_mi], disc_type)
+
+# Report field -> (models it needs, value from the predictions), in report order
+REPORT_FIELDS = {
+    'personality_type': (['personality'], lambda pred: pred['personality_type']),
+    'disc_profile': (['disc'], lambda pred: json.dumps(dict(zip(['D','I','S','C'], map(lambda x: round(x, 1), pred['disc_scores']))))),
+    'learning_style': (['learning'], lambda pred: pred['learning_style']),
+    'brain_dominance': (['disc', 'mi'], lambda pred: estimate_brain_dominance(pred['disc_scores'], pred['mi_scores'])),
+    'holland_code': (['holland'], lambda pred: pred['holland_code']),
+    'mi_distribution': (['mi'], lambda pred: json.dumps(mi_distribution(pred))),
+    'sensing_capability': (['sensing'], lambda pred: pred['sensing_capability']),
+    'thought_process': (['thought'], lambda pred: pred['thought_process']),
+    'psychological_capability': (['psych'], lambda pred: pred['psychological_capability']),
+    'leadership_style': (['leadership'], lambda pred: pred['leadership_style']),
+    'grit_score': (['grit'], lambda pred: round(pred['grit_score'], 1)),
+    'aq_score': (['aq'], lambda pred: round(pred['aq_score'], 1)),
+    'eq_score': (['eq'], lambda pred: round(pred['eq_score'], 1)),
+    'emotional_regulation': (['emotional_regulation'], lambda pred: round(pred['emotional_regulation'], 1)),
+    'flow_state_score': (['flow_state'], lambda pred: round(pred['flow_state_score'], 1)),
+    'cognitive_load_index': (['cognitive_load'], lambda pred: round(pred['cognitive_load_index'], 1)),
+    'ocean_traits': (['ocean'], lambda pred: json.dumps(dict(zip(
+        ['Openness', 'Conscientiousness', 'Extraversion', 'Agreeableness', 'Neuroticism'],
+        map(lambda x: round(x, 1), pred['ocean_traits'])
+    )))),
+    'ocean_description': (['ocean'], lambda pred: json.dumps(generate_ocean_profile(pred['ocean_traits']))),
+    'eq_breakdown': (['eq'], lambda pred: json.dumps(calculate_eq_breakdown(pred['eq_score']))),
+    'career_recommendations': (['holland', 'mi', 'disc'], lambda pred: json.dumps(career_recommendations(pred))),
+    'swot_analysis': (['disc', 'mi'], lambda pred: json.dumps(generate_swot(pred))),
+    'accuracy': (['personality', 'grit'], lambda pred: pred['accuracy']),
+    'tfrc': ([], lambda pred: pred['composite']['tfrc']),
+    'ridge_density': ([], lambda pred: pred['composite']['ridge_density']),
+    'atd_angle': ([], lambda pred: pred['composite']['atd_angle']),
+    'core_delta_ratio': ([], lambda pred: pred['composite']['core_delta_ratio']),
+    'pattern_distribution': ([], lambda pred: json.dumps(pred['composite']['pattern_distribution']))
+}
 
-    return {
-        'personality_type': pred['personality_type'],
-        'disc_profile': json.dumps(dict(zip(['D','I','S','C'], map(lambda x: round(x, 1), pred['disc_scores'])))),
-        'learning_style': pred['learning_style'],
-        'brain_dominance': estimate_brain_dominance(pred['disc_scores'], pred['mi_scores']),
-        'holland_code': pred['holland_code'],
-        'mi_distribution': json.dumps(mi_dict),
-        'sensing_capability': pred['sensing_capability'],
-        'thought_process': pred['thought_process'],
-        'psychological_capability': pred['psychological_capability'],
-        'leadership_style': pred['leadership_style'],
-        'grit_score': round(pred['grit_score'], 1),
-        'aq_score': round(pred['aq_score'], 1),
-        'eq_score': round(pred['eq_score'], 1),
-        'emotional_regulation': round(pred['emotional_regulation'], 1),
-        'flow_state_score': round(pred['flow_state_score'], 1),
-        'cognitive_load_index': round(pred['cognitive_load_index'], 1),
-        'ocean_traits': json.dumps(dict(zip(
-            ['Openness', 'Conscientiousness', 'Extraversion', 'Agreeableness', 'Neuroticism'],
-            map(lambda x: round(x, 1), pred['ocean_traits'])
-        ))),
-        'ocean_description': json.dumps(generate_ocean_profile(pred['ocean_traits'])),
-        'eq_breakdown': json.dumps(calculate_eq_breakdown(pred['eq_score'])),
-        'career_recommendations': json.dumps(get_career_recommendations(pred['holland_code'], [m[0] for m in top_mi], disc_type)),
-        'swot_analysis': json.dumps(generate_swot(pred)),
-        'accuracy': pred['accuracy'],
-        'tfrc': pred['composite']['tfrc'],
-        'ridge_density': pred['composite']['ridge_density'],
-        'atd_angle': pred['composite']['atd_angle'],
-        'core_delta_ratio': pred['composite']['core_delta_ratio'],
-        'pattern_distribution': json.dumps(pred['composite']['pattern_distribution'])
+# Report sections a payload can ask for with "sections": [...]
+SECTIONS = {
+    'personality': ['personality_type'],
+    'disc': ['disc_profile'],
+    'learning': ['learning_style'],
+    'brain_dominance': ['brain_dominance'],
+    'holland': ['holland_code'],
+    'mi': ['mi_distribution'],
+    'capabilities': ['sensing_capability', 'thought_process', 'psychological_capability'],
+    'leadership': ['leadership_style'],
+    'scores': ['grit_score', 'aq_score', 'emotional_regulation', 'flow_state_score', 'cognitive_load_index'],
+    'eq': ['eq_score', 'eq_breakdown'],
+    'ocean': ['ocean_traits', 'ocean_description'],
+    'career': ['career_recommendations'],
+    'swot': ['swot_analysis'],
+    'accuracy': ['accuracy'],
+    'fingerprints': ['tfrc', 'ridge_density', 'atd_angle', 'core_delta_ratio', 'pattern_distribution']
+}
+
+def report_fields(sections=None):
+    """Report fields of the requested sections (default: all), in report order"""
+    if sections is None:
+        return list(REPORT_FIELDS)
+    if not isinstance(sections, list):
+        raise ValueError("Invalid sections: expected a list of section names")
+    unknown = [section for section in sections if section not in SECTIONS]
+    if unknown:
+        raise ValueError(f"Unknown report sections: {', '.join(map(str, unknown))}")
+    wanted = {field for section in sections for field in SECTIONS[section]}
+    return [field for field in REPORT_FIELDS if field in wanted]
+
+def required_models(fields):
+    """Models the given report fields depend on, in MODEL_NAMES order"""
+    needed = {name for field in fields for name in REPORT_FIELDS[field][0]}
+    return [name for name in MODEL_NAMES if name in needed]
+
+def build_report(pred, fields=None):
+    return {field: REPORT_FIELDS[field][1](pred) for field in (fields if fields is not None else REPORT_FIELDS)}
+
+def error_response(message, test_id, rejections=None):
+    response = {
+        "status": "error",
+        "message": message,
+        "test_id": test_id
     }
+    # Per-finger reasons of a quality gate rejection
+    if rejections:
+        response["rejections"] = rejections
+    return response
 
-def run_analysis(payload):
-    test_id = payload.get('test_id', -1)
+def prepare_test(payload):
+    """Validate one payload and extract its features; returns (features, composite)"""
     fingerprints = payload.get('fingerprints', {})
 
     if len(fingerprints) != 10:
-        return {
-            "status": "error",
-            "message": "Exactly 10 fingerprints required.",
-            "test_id": test_id
-        }
+        raise ValueError("Exactly 10 fingerprints required.")
 
-    try:
-        features = {k: extract_features(v) for k, v in fingerprints.items()}
+    with metrics.stage('extract'):
+        features = extract_test_features(fingerprints)
+    with metrics.stage('composite'):
         composite = calculate_composite(features)
-        models = load_models()
-        predictions = predict(models, features, composite)
-        report = build_report(predictions)
-        report['test_id'] = test_id
-        report['success'] = True
-        return report
+    return features, composite
+
+def run_analysis(payload, models=None):
+    return run_analysis_batch([payload], models)[0]
+
+def run_analysis_batch(payloads, models=None):
+    """
+    Analyze many tests with one stacked prediction pass per model.
+    Returns one report or error response per payload, in input order;
+    a failing test never fails the rest of the batch.
+    """
+    results = [None] * len(payloads)
+    timings = [metrics.collect(payload) for payload in payloads]
+    prepared = []
+
+    for i, payload in enumerate(payloads):
+        test_id = payload.get('test_id', -1) if isinstance(payload, dict) else -1
+        token = metrics.activate(timings[i])
+        try:
+            if not isinstance(payload, dict):
+                raise ValueError("Invalid input format: payload must be an object")
+            fields = report_fields(payload.get('sections'))
+            features, composite = prepare_test(payload)
+            prepared.append((i, test_id, features, composite, fields))
+        except Exception as e:
+            results[i] = error_response(str(e), test_id, getattr(e, 'rejections', None))
+        finally:
+            metrics.deactivate(token)
+
+    # Model loading and prediction are shared by every test of the batch
+    shared = metrics.Timings() if any(t is not None for t in timings) else None
+    token = metrics.activate(shared)
+    try:
+        if prepared:
+            predict_and_report(prepared, models, results)
+    finally:
+        metrics.deactivate(token)
+
+    scored = {i for i, _, _, _, _ in prepared}
+    return [
+        metrics.finish(result, 'full', timings[i], shared if i in scored else None)
+        for i, result in enumerate(results)
+    ]
+
+def predict_and_report(prepared, models, results):
+    # Only the models behind the requested sections of the batch are loaded and run
+    names = required_models({field for _, _, _, _, fields in prepared for field in fields})
+    try:
+        if models is None and names:
+            with metrics.stage('load_models'):
+                models = load_models(names)
+        with metrics.stage('predict'):
+            predictions = predict_batch(
+                models,
+                [build_feature_row(features, composite) for _, _, features, composite, _ in prepared],
+                [composite for _, _, _, composite, _ in prepared],
+                names
+            )
     except Exception as e:
-        return {
-            "status": "error",
-            "message": str(e),
-            "test_id": test_id
-        }
+        for i, test_id, _, _, _ in prepared:
+            results[i] = error_response(str(e), test_id)
+        return
+
+    for (i, test_id, _, _, fields), pred in zip(prepared, predictions):
+        try:
+            with metrics.stage('report'):
+                report = build_report(pred, fields)
+            report['test_id'] = test_id
+            report['success'] = True
+            results[i] = report
+        except Exception as e:
+            results[i] = error_response(str(e), test_id)
+
+def read_payloads(path):
+    """Read a JSON array or JSON-lines file of payloads"""
+    with open(path, 'r') as f:
+        text = f.read()
+    if text.lstrip().startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+def run_stream(stream):
+    """Analyze framed tests (see framing.py) from a binary stream, printing one report line per frame"""
+    models = load_models()
+    for payload in framing.read_frames(stream):
+        print(json.dumps(run_analysis(payload, models=models)), flush=True)
 
 # --- Main CLI Entry ---
 if __name__ == '__main__':
-    if len(sys.argv) < 3:
+    startup.install_report(sys.argv)
+    if len(sys.argv) < 3 and sys.argv[1:] != ['--stream']:
         print(json.dumps({
             "status": "error",
-            "message": "Usage: python analysis.py --realtime <json> OR --file <path>",
+            "message": "Usage: python analysis.py --realtime <json> OR --file <path> OR --batch <path> OR --stream [--startup-report]",
             "test_id": -1
         }))
         sys.exit(1)
 
     mode = sys.argv[1]
-    data = sys.argv[2]
+    data = sys.argv[2] if len(sys.argv) > 2 else None
 
     try:
         if mode == '--realtime':
@@ -357,8 +550,15 @@ if __name__ == '__main__':
         elif mode == '--file':
             with open(data, 'r') as f:
                 payload = json.load(f)
+        elif mode == '--batch':
+            for result in run_analysis_batch(read_payloads(data)):
+                print(json.dumps(result))
+            sys.exit(0)
+        elif mode == '--stream':
+            run_stream(sys.stdin.buffer)
+            sys.exit(0)
         else:
-            raise ValueError("Invalid mode. Use --realtime or --file")
+            raise ValueError("Invalid mode. Use --realtime, --file, --batch or --stream")
 
         result = run_analysis(payload)
         print(json.dumps(result))
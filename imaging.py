@@ -0,0 +1,210 @@
+"""
+Shared image input helpers for the fingerprint extractors.
+
+With DMIT_REDUCED_DECODE=1, JPEG scans whose header dimensions allow it
+are decoded at 1/2, 1/4 or 1/8 scale in the DCT domain
+(IMREAD_REDUCED_GRAYSCALE_*) instead of being fully decoded and then
+shrunk to 500x500. The reduced image always stays at least TARGET_SIZE on
+both sides, so the following resize is still a downscale. The features
+drift slightly; measure the drift with equivalence.py before enabling it.
+
+The extractors only use three things from the RETR_TREE contour list of
+the thresholded image: its length, contours[0] and the first point of
+contours[1]. With DMIT_CONTOUR_MODE=fast, contour_summary() derives them
+from connected-component labels instead of tracing every border:
+
+    count        8-connected foreground components plus holes, from the
+                 component count and the Euler number (2C - E)
+    contours[0]  outer border of the last top-level component in raster
+                 order, traced on its bounding box only
+    contours[1]  first hole of that component, or else the outer border of
+                 the previous top-level component
+
+The result is identical to the tree mode; equivalence.py contours checks
+it on a corpus.
+
+stack_statistics() thresholds a stack of resized fingers and computes
+their image moments and intensity statistics in single NumPy passes; the
+values are bit-identical to cv2.threshold, cv2.moments, np.mean and np.std
+per image.
+"""
+import os
+import struct
+import cv2
+import numpy as np
+import metrics
+
+REDUCED_DECODE = os.environ.get('DMIT_REDUCED_DECODE') == '1'
+CONTOUR_MODE = os.environ.get('DMIT_CONTOUR_MODE', 'tree')
+
+# Side of the square image the extractors work on
+TARGET_SIZE = 500
+
+REDUCED_FLAGS = {
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2
+}
+
+# Weights of the 2x2 bit-quad patterns in the 8-connectivity Euler number
+# (Gray): +1 one pixel set, -1 three set, -2 diagonal pair, all times 4
+EULER_WEIGHTS = np.array([0, 1, 1, 0, 1, 0, -2, -1, 1, -2, 0, -1, 0, -1, -1, 0])
+
+# JPEG start-of-frame markers carrying the image dimensions
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def read_image_bytes(image_input):
+    """Return the encoded image bytes of a path or bytes input, None if unreadable"""
+    if isinstance(image_input, bytes):
+        return image_input
+    try:
+        with open(image_input, 'rb') as f:
+            return f.read()
+    except (OSError, TypeError):
+        return None
+
+def jpeg_dimensions(data):
+    """(width, height) from the JPEG frame header, None if not a JPEG or malformed"""
+    if data[:2] != b'\xff\xd8':
+        return None
+    position = 2
+    while position + 4 <= len(data):
+        if data[position] != 0xFF:
+            return None
+        marker = data[position + 1]
+        if marker == 0xFF:
+            position += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            position += 2
+            continue
+        length = struct.unpack('>H', data[position + 2:position + 4])[0]
+        if marker in SOF_MARKERS:
+            if position + 9 > len(data):
+                return None
+            height, width = struct.unpack('>HH', data[position + 5:position + 9])
+            return width, height
+        position += 2 + length
+    return None
+
+def reduction_factor(width, height, target=TARGET_SIZE):
+    """Largest DCT scale factor that keeps both sides at least target pixels"""
+    for factor in (8, 4, 2):
+        if width // factor >= target and height // factor >= target:
+            return factor
+    return 1
+
+def decode_grayscale(data, reduced=None):
+    """Decode encoded image bytes to a grayscale array, None if undecodable"""
+    if not data:
+        return None
+    buffer = np.frombuffer(data, np.uint8)
+    if REDUCED_DECODE if reduced is None else reduced:
+        dimensions = jpeg_dimensions(data)
+        factor = reduction_factor(*dimensions) if dimensions else 1
+        if factor > 1:
+            img = cv2.imdecode(buffer, REDUCED_FLAGS[factor])
+            if img is not None:
+                return img
+    return cv2.imdecode(buffer, cv2.IMREAD_GRAYSCALE)
+
+def load_resized(data):
+    """Decode encoded image bytes and resize to TARGET_SIZE square, None if undecodable"""
+    with metrics.stage('decode'):
+        img = decode_grayscale(data)
+    if img is None:
+        return None
+    with metrics.stage('resize'):
+        return cv2.resize(img, (TARGET_SIZE, TARGET_SIZE))
+
+def stack_statistics(images):
+    """Binary threshold at 127, spatial moments m00/m10/m01, mean and std of equally sized images"""
+    stack = np.stack(images)
+    with metrics.stage('threshold'):
+        foreground = stack > 127
+        thresh = foreground.view(np.uint8) * np.uint8(255)
+    with metrics.stage('moments'):
+        rows = foreground.sum(axis=2, dtype=np.int64)
+        columns = foreground.sum(axis=1, dtype=np.int64)
+        # Integer sums stay exact in float64, as in cv2.moments
+        m00 = 255.0 * rows.sum(axis=1)
+        m10 = 255.0 * (columns @ np.arange(stack.shape[2]))
+        m01 = 255.0 * (rows @ np.arange(stack.shape[1]))
+    flat = stack.reshape(len(images), -1)
+    return {
+        'thresh': thresh,
+        'm00': m00,
+        'm10': m10,
+        'm01': m01,
+        'mean': flat.mean(axis=1),
+        'std': flat.std(axis=1)
+    }
+
+def decode_variant():
+    """Suffix for feature cache keys; reduced decodes produce different features"""
+    return '+reduced' if REDUCED_DECODE else ''
+
+def contour_summary(thresh):
+    """(count, contours[0], contours[1] first point) of the RETR_TREE contours of a binary image"""
+    if CONTOUR_MODE != 'fast':
+        contours, _ = cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+        first = contours[0] if contours else None
+        second_start = contours[1][0][0] if len(contours) > 1 else None
+        return len(contours), first, second_start
+
+    # Wu's algorithm numbers components in raster order of their first pixel,
+    # the order in which findContours discovers their outer borders
+    n, labels = cv2.connectedComponentsWithAlgorithm(thresh, 8, cv2.CV_32S, cv2.CCL_WU)
+    if n == 1:
+        return 0, None, None
+    count = 2 * (n - 1) - euler_number(thresh)
+
+    top_level = TopLevel(thresh, labels)
+    first_label = top_level.last(n - 1)
+    contours, _ = component_contours(labels, first_label, cv2.RETR_TREE)
+    if len(contours) > 1:
+        return count, contours[0], contours[1][0][0]
+    if count == 1:
+        return count, contours[0], None
+    second, _ = component_contours(labels, top_level.last(first_label - 1), cv2.RETR_EXTERNAL)
+    return count, contours[0], second[0][0][0]
+
+def euler_number(binary):
+    """8-connectivity Euler number (components minus holes) by bit-quad counting"""
+    b = np.pad((binary > 0).view(np.uint8), 1)
+    quads = b[:-1, :-1] + 2 * b[:-1, 1:] + 4 * b[1:, :-1] + 8 * b[1:, 1:]
+    return int(np.bincount(quads.ravel(), minlength=16) @ EULER_WEIGHTS) // 4
+
+def component_contours(labels, label, mode):
+    """Contours of one component, traced on its bounding box only"""
+    mask = (labels == label).view(np.uint8)
+    x, y, w, h = cv2.boundingRect(mask)
+    return cv2.findContours(mask[y:y + h, x:x + w], mode, cv2.CHAIN_APPROX_SIMPLE, offset=(x, y))
+
+class TopLevel:
+    """Finds the components not nested in a hole of another one"""
+
+    def __init__(self, thresh, labels):
+        self.thresh = thresh
+        self.labels = labels
+        self.top_labels = None
+
+    def last(self, label):
+        """Highest top-level label not above label"""
+        height, width = self.labels.shape
+        x, y, w, h = cv2.boundingRect((self.labels == label).view(np.uint8))
+        # A component touching the image border cannot sit inside a hole
+        if x == 0 or y == 0 or x + w == width or y + h == height:
+            return label
+        top = self.top_level_labels()
+        return int(top[top <= label].max())
+
+    def top_level_labels(self):
+        # Top-level components are those 4-adjacent to the background
+        # region around the image; their first pixel's left neighbour is in it
+        if self.top_labels is None:
+            background = cv2.copyMakeBorder(255 - self.thresh, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=255)
+            _, regions = cv2.connectedComponentsWithAlgorithm(background, 4, cv2.CV_32S, cv2.CCL_WU)
+            outside = regions[1:-1, :-2] == regions[0, 0]
+            self.top_labels = np.unique(self.labels[(self.thresh > 0) & outside])
+        return self.top_labels
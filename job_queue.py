@@ -0,0 +1,318 @@
+"""
+Durable local job queue for analyses.
+
+The web request only enqueues a test and returns; a supervised pool of
+worker processes scores it in the background. Jobs live in one SQLite
+file, so the queue survives restarts and needs no broker.
+
+    python job_queue.py enqueue [--pipeline full|basic] [--input <path|->]
+    python job_queue.py status <test_id>
+    python job_queue.py work [--pipeline full|basic] [--workers N] [--model-dir DIR]
+
+enqueue reads one payload, either the usual JSON object or a binary frame
+(see framing.py), stores it and prints the job status. A test that already
+has a job is not enqueued again. The queue refuses new jobs while
+DMIT_QUEUE_MAX jobs are waiting, so a burst of uploads cannot pile up
+without bound.
+
+work starts the workers and restarts any that exit. Each worker claims
+one job at a time for a lease and runs it on the pipeline stored with the
+job, loading the models of a pipeline once, on its first job; --pipeline
+restricts the workers to one pipeline. A job is retried, after
+RETRY_DELAY * 2^(attempt - 1) seconds, when its worker dies or its lease
+runs out, when the analysis raises or its models cannot be loaded (every
+model is unpickled on load, so a broken bundle fails here); after
+DMIT_QUEUE_ATTEMPTS attempts it fails with the last error. An error report
+(unreadable images, invalid input, quality gate rejections, see
+quality_gate.py) is final at once, since the same payload fails the same
+way. SIGHUP
+restarts the workers so they load retrained models, and SIGTERM stops
+them after their current job.
+
+Jobs map onto the status column of the tests table:
+
+    queued, processing  ->  processing
+    completed           ->  completed (result holds the report)
+    failed              ->  failed (result holds the error response)
+
+    DMIT_QUEUE_DB        SQLite file (default job_queue.sqlite next to this script)
+    DMIT_QUEUE_WORKERS   worker processes (default min(2, cpus))
+    DMIT_QUEUE_MAX       waiting jobs before enqueue refuses (default 1000)
+    DMIT_QUEUE_ATTEMPTS  attempts per job (default 3)
+    DMIT_QUEUE_LEASE     seconds a worker may hold a job (default 300)
+"""
+import sys
+import io
+import json
+import os
+import time
+import signal
+import sqlite3
+import subprocess
+import importlib
+from collections.abc import Mapping
+import framing
+
+USAGE = ("Usage: python job_queue.py enqueue [--pipeline full|basic] [--input <path|->] | status <test_id> | "
+         "work [--pipeline full|basic] [--workers N] [--model-dir DIR]")
+
+QUEUE_DB = os.environ.get('DMIT_QUEUE_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'job_queue.sqlite'))
+QUEUE_WORKERS = int(os.environ.get('DMIT_QUEUE_WORKERS', min(2, os.cpu_count() or 1)))
+QUEUE_MAX = int(os.environ.get('DMIT_QUEUE_MAX', 1000))
+QUEUE_ATTEMPTS = int(os.environ.get('DMIT_QUEUE_ATTEMPTS', 3))
+QUEUE_LEASE = float(os.environ.get('DMIT_QUEUE_LEASE', 300))
+
+RETRY_DELAY = 5.0
+POLL_INTERVAL = 0.5
+RESTART_DELAY = 2.0
+
+PIPELINES = {
+    'full': 'full_model_based_analysis',
+    'basic': 'analysis'
+}
+
+# Job state -> tests.status
+TEST_STATUS = {
+    'queued': 'processing',
+    'processing': 'processing',
+    'completed': 'completed',
+    'failed': 'failed'
+}
+
+def connect(path=None):
+    db = sqlite3.connect(path or QUEUE_DB, timeout=30, isolation_level=None)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS jobs (test_id INTEGER PRIMARY KEY, pipeline TEXT NOT NULL, payload BLOB, "
+        "state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, available_at REAL NOT NULL, lease_until REAL, "
+        "worker INTEGER, result TEXT, error TEXT, enqueued_at REAL NOT NULL, finished_at REAL)"
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS jobs_waiting ON jobs (state, available_at)")
+    return db
+
+def decode_payload(data):
+    """Payload of a stored job: a binary frame or a JSON object"""
+    if data[:1] == framing.MAGIC[:1]:
+        payload = framing.read_frame(io.BytesIO(data))
+    else:
+        payload = json.loads(data)
+    if not isinstance(payload, dict) or 'test_id' not in payload or 'fingerprints' not in payload:
+        raise ValueError("Invalid input format: missing 'test_id' or 'fingerprints'")
+    return payload
+
+def enqueue(db, data, pipeline='full'):
+    """Store a payload as a queued job unless its test already has one; returns the job status"""
+    test_id = int(decode_payload(data)['test_id'])
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        if db.execute("SELECT 1 FROM jobs WHERE test_id = ?", (test_id,)).fetchone() is None:
+            waiting = db.execute("SELECT COUNT(*) FROM jobs WHERE state = 'queued'").fetchone()[0]
+            if waiting >= QUEUE_MAX:
+                raise RuntimeError(f"Queue full: {waiting} jobs waiting")
+            now = time.time()
+            db.execute(
+                "INSERT INTO jobs (test_id, pipeline, payload, state, available_at, enqueued_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (test_id, pipeline, sqlite3.Binary(data), now, now)
+            )
+        db.execute("COMMIT")
+    except Exception:
+        db.execute("ROLLBACK")
+        raise
+    return status(db, test_id)
+
+def status(db, test_id):
+    """State, tests.status and result of the job of a test; state None when it has no job"""
+    row = db.execute(
+        "SELECT state, attempts, result, error, (SELECT COUNT(*) FROM jobs AS ahead WHERE ahead.state = 'queued' "
+        "AND ahead.enqueued_at < jobs.enqueued_at) FROM jobs WHERE test_id = ?",
+        (test_id,)
+    ).fetchone()
+    if row is None:
+        return {'test_id': test_id, 'state': None, 'test_status': None}
+    state, attempts, result, error, ahead = row
+    job = {'test_id': test_id, 'state': state, 'test_status': TEST_STATUS[state], 'attempts': attempts}
+    if state == 'queued':
+        job['ahead'] = ahead
+    if error:
+        job['error'] = error
+    if result is not None:
+        job['result'] = json.loads(result)
+    return job
+
+def retry_or_fail(db, where, params, error):
+    """Requeue the matching processing jobs with backoff, or fail those out of attempts"""
+    now = time.time()
+    db.execute(
+        "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+        "available_at = ? + ? * (1 << (attempts - 1)), lease_until = NULL, worker = NULL, error = ?, "
+        "result = CASE WHEN attempts >= ? THEN json_object('status', 'error', 'message', ?, 'test_id', test_id) ELSE NULL END, "
+        "finished_at = CASE WHEN attempts >= ? THEN ? ELSE NULL END, "
+        "payload = CASE WHEN attempts >= ? THEN NULL ELSE payload END "
+        f"WHERE state = 'processing' AND {where}",
+        [QUEUE_ATTEMPTS, now, RETRY_DELAY, error, QUEUE_ATTEMPTS,
+         error, QUEUE_ATTEMPTS, now, QUEUE_ATTEMPTS] + list(params)
+    )
+
+def release_worker(db, pid, error):
+    """Return the jobs of a dead worker to the queue"""
+    retry_or_fail(db, "worker = ?", (pid,), error)
+
+def claim(db, pipeline, pid):
+    """
+    Next due job, of any pipeline when pipeline is None, as (test_id,
+    pipeline, payload bytes), or None; expired leases are recovered first.
+    """
+    now = time.time()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        retry_or_fail(db, "lease_until < ?", (now,), "Job lease expired")
+        row = db.execute(
+            "SELECT test_id, pipeline, payload FROM jobs WHERE state = 'queued' AND (? IS NULL OR pipeline = ?) "
+            "AND available_at <= ? ORDER BY available_at LIMIT 1",
+            (pipeline, pipeline, now)
+        ).fetchone()
+        if row is not None:
+            db.execute(
+                "UPDATE jobs SET state = 'processing', attempts = attempts + 1, lease_until = ?, worker = ? WHERE test_id = ?",
+                (now + QUEUE_LEASE, pid, row[0])
+            )
+        db.execute("COMMIT")
+    except Exception:
+        db.execute("ROLLBACK")
+        raise
+    return None if row is None else (row[0], row[1], bytes(row[2]))
+
+def finish(db, test_id, result):
+    """Store the report or error response of a job; the payload is no longer needed"""
+    state = 'completed' if result.get('success') else 'failed'
+    db.execute(
+        "UPDATE jobs SET state = ?, result = ?, error = ?, lease_until = NULL, worker = NULL, payload = NULL, "
+        "finished_at = ? WHERE test_id = ? AND state = 'processing'",
+        (state, json.dumps(result), None if result.get('success') else result.get('message'), time.time(), test_id)
+    )
+
+def load_pipeline(pipeline, model_dir=None):
+    """(pipeline module, loaded models); lazily loaded models are unpickled here so their errors are retried"""
+    module = importlib.import_module(PIPELINES[pipeline])
+    if model_dir:
+        module.MODEL_DIR = model_dir
+    models = module.load_models()
+    if isinstance(models, Mapping):
+        for name in models:
+            models[name]
+    return module, models
+
+def run_worker(pipeline=None, db_path=None, model_dir=None):
+    """Score jobs (of one pipeline, or all) until SIGTERM; the models of each pipeline are loaded once"""
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    db = connect(db_path)
+    pid = os.getpid()
+    loaded = {}
+
+    while not stopping:
+        job = claim(db, pipeline, pid)
+        if job is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+        test_id, job_pipeline, data = job
+        try:
+            if job_pipeline not in loaded:
+                loaded[job_pipeline] = load_pipeline(job_pipeline, model_dir)
+            module, models = loaded[job_pipeline]
+            result = module.run_analysis(decode_payload(data), models=models)
+        except Exception as e:
+            retry_or_fail(db, "test_id = ?", (test_id,), str(e))
+            continue
+        finish(db, test_id, result)
+
+def supervise(pipeline, workers, db_path=None, model_dir=None):
+    """Keep the worker processes running, restarting any that exit, until SIGTERM or SIGINT"""
+    db = connect(db_path)
+    command = [sys.executable, os.path.abspath(__file__), 'worker']
+    if pipeline:
+        command += ['--pipeline', pipeline]
+    if model_dir:
+        command += ['--model-dir', model_dir]
+    env = dict(os.environ)
+    if db_path:
+        env['DMIT_QUEUE_DB'] = db_path
+    if workers > 1 and 'DMIT_EXTRACT_WORKERS' not in env:
+        # The worker processes already keep the cores busy
+        env['DMIT_EXTRACT_WORKERS'] = '1'
+
+    events = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: events.append('stop'))
+    signal.signal(signal.SIGINT, lambda signum, frame: events.append('stop'))
+    signal.signal(signal.SIGHUP, lambda signum, frame: events.append('restart'))
+
+    processes = [None] * workers
+    started = [0.0] * workers
+    while 'stop' not in events:
+        if 'restart' in events:
+            events.remove('restart')
+            for process in processes:
+                if process is not None:
+                    process.terminate()
+        for i, process in enumerate(processes):
+            if process is not None and process.poll() is not None:
+                if process.returncode != 0:
+                    release_worker(db, process.pid, f"Worker exited with status {process.returncode}")
+                processes[i] = None
+            # Back off a worker that keeps dying
+            if processes[i] is None and time.time() - started[i] >= RESTART_DELAY:
+                processes[i] = subprocess.Popen(command, env=env)
+                started[i] = time.time()
+        time.sleep(POLL_INTERVAL)
+
+    for process in processes:
+        if process is not None:
+            process.terminate()
+    for process in processes:
+        if process is not None and process.wait() != 0:
+            release_worker(db, process.pid, f"Worker exited with status {process.returncode}")
+
+def parse_options(args, options):
+    args = list(args)
+    while args:
+        flag = args.pop(0)
+        if flag not in options or not args:
+            raise ValueError(USAGE)
+        options[flag] = args.pop(0)
+    if options.get('--pipeline') is not None and options['--pipeline'] not in PIPELINES:
+        raise ValueError(USAGE)
+    return options
+
+def main(argv):
+    if not argv or argv[0] not in ('enqueue', 'status', 'work', 'worker'):
+        raise ValueError(USAGE)
+    command, args = argv[0], argv[1:]
+
+    if command == 'status':
+        if len(args) != 1:
+            raise ValueError(USAGE)
+        print(json.dumps(status(connect(), int(args[0]))))
+    elif command == 'enqueue':
+        options = parse_options(args, {'--pipeline': 'full', '--input': '-'})
+        if options['--input'] == '-':
+            data = sys.stdin.buffer.read()
+        else:
+            with open(options['--input'], 'rb') as f:
+                data = f.read()
+        print(json.dumps(enqueue(connect(), data, options['--pipeline'])))
+    elif command == 'work':
+        options = parse_options(args, {'--pipeline': None, '--workers': str(QUEUE_WORKERS), '--model-dir': None})
+        supervise(options['--pipeline'], max(1, int(options['--workers'])), model_dir=options['--model-dir'])
+    else:
+        options = parse_options(args, {'--pipeline': None, '--model-dir': None})
+        run_worker(options['--pipeline'], model_dir=options['--model-dir'])
+
+if __name__ == '__main__':
+    try:
+        main(sys.argv[1:])
+    except Exception as e:
+        print(json.dumps({"status": "error", "message": str(e), "test_id": -1}))
+        sys.exit(1)
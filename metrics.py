@@ -0,0 +1,190 @@
+"""
+Opt-in per-stage timing for the analysis pipelines.
+
+Collection is enabled with DMIT_TIMINGS=1, with `"timings": true` in a
+payload, or by configuring a sink. When it is enabled, every report gets a
+`timings` key: milliseconds per stage (decode, resize, threshold, contours,
+moments, extract, composite, load_models, predict, report), per finger, and
+in total. Stages are summed over the fingers of a test. With collection
+disabled, stage() returns a shared no-op context manager after a single
+context-variable lookup.
+
+Sinks, both optional:
+
+    DMIT_METRICS_TEXTFILE  Prometheus textfile (node_exporter textfile
+                           collector); counters and latency histograms are
+                           aggregated across processes under a file lock
+    DMIT_STATSD            host:port of a StatsD daemon (UDP, fire and forget)
+"""
+import os
+import json
+import time
+import socket
+import fcntl
+import threading
+import contextvars
+from contextlib import contextmanager, nullcontext
+
+ENABLED = os.environ.get('DMIT_TIMINGS') == '1'
+TEXTFILE = os.environ.get('DMIT_METRICS_TEXTFILE')
+STATSD = os.environ.get('DMIT_STATSD')
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+_current = contextvars.ContextVar('dmit_timings', default=None)
+_null = nullcontext()
+
+class Timings:
+    """Stage and per-finger durations of one test"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.fingers = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        with self.lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def record_finger(self, finger, seconds):
+        with self.lock:
+            self.fingers[finger] = seconds
+
+    def merge(self, other):
+        with self.lock:
+            for name, seconds in other.stages.items():
+                self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                'total_ms': round((time.perf_counter() - self.started) * 1000, 3),
+                'stages': {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()},
+                'fingers': {finger: round(seconds * 1000, 3) for finger, seconds in self.fingers.items()}
+            }
+
+def enabled(payload=None):
+    if ENABLED or TEXTFILE or STATSD:
+        return True
+    return isinstance(payload, dict) and bool(payload.get('timings'))
+
+def collect(payload=None):
+    """A fresh collector for one test, or None when timing is disabled"""
+    return Timings() if enabled(payload) else None
+
+def finish(result, pipeline, timings, shared=None):
+    """Attach the timings of one test to its result and emit them; no-op without a collector"""
+    if timings is None:
+        return result
+    if shared is not None:
+        timings.merge(shared)
+    result['timings'] = timings.as_dict()
+    emit(pipeline, timings, bool(result.get('success')))
+    return result
+
+def current():
+    return _current.get()
+
+def activate(timings):
+    """Make timings the collector of the current context; returns a reset token"""
+    return _current.set(timings)
+
+def deactivate(token):
+    _current.reset(token)
+
+def stage(name):
+    """Time a block into the active collector; a no-op when none is active"""
+    timings = _current.get()
+    if timings is None:
+        return _null
+    return timings.stage(name)
+
+def emit(pipeline, timings, success):
+    """Send one finished test to the configured sinks"""
+    if not (TEXTFILE or STATSD):
+        return
+    data = timings.as_dict()
+    try:
+        if STATSD:
+            send_statsd(pipeline, data, success)
+        if TEXTFILE:
+            update_textfile(pipeline, data, success)
+    except Exception:
+        # Metrics must never fail an analysis
+        pass
+
+def send_statsd(pipeline, data, success):
+    host, _, port = STATSD.rpartition(':')
+    lines = [f"dmit.{pipeline}.tests.{'success' if success else 'error'}:1|c",
+             f"dmit.{pipeline}.total:{data['total_ms']}|ms"]
+    lines += [f"dmit.{pipeline}.stage.{name}:{ms}|ms" for name, ms in data['stages'].items()]
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.sendto('\n'.join(lines).encode(), (host or '127.0.0.1', int(port)))
+
+def update_textfile(pipeline, data, success):
+    """Fold one test into the aggregate state and rewrite the textfile atomically"""
+    state_path = TEXTFILE + '.state.json'
+    with open(TEXTFILE + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {'tests': {}, 'histograms': {}}
+
+        outcome = 'success' if success else 'error'
+        key = f'{pipeline}|{outcome}'
+        state['tests'][key] = state['tests'].get(key, 0) + 1
+
+        observations = dict(data['stages'], total=data['total_ms'])
+        for stage_name, ms in observations.items():
+            key = f'{pipeline}|{stage_name}'
+            histogram = state['histograms'].setdefault(key, {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0})
+            seconds = ms / 1000
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+
+        write_atomic(state_path, json.dumps(state))
+        write_atomic(TEXTFILE, render_textfile(state))
+
+def render_textfile(state):
+    lines = [
+        '# HELP dmit_tests_total Analyzed tests by pipeline and outcome.',
+        '# TYPE dmit_tests_total counter'
+    ]
+    for key, count in sorted(state['tests'].items()):
+        pipeline, outcome = key.split('|')
+        lines.append(f'dmit_tests_total{{pipeline="{pipeline}",outcome="{outcome}"}} {count}')
+
+    lines += [
+        '# HELP dmit_stage_duration_seconds Duration of each analysis stage.',
+        '# TYPE dmit_stage_duration_seconds histogram'
+    ]
+    for key, histogram in sorted(state['histograms'].items()):
+        pipeline, stage_name = key.split('|')
+        labels = f'pipeline="{pipeline}",stage="{stage_name}"'
+        for bound, count in zip(BUCKETS, histogram['buckets']):
+            lines.append(f'dmit_stage_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'dmit_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram["count"]}')
+        lines.append(f'dmit_stage_duration_seconds_sum{{{labels}}} {histogram["sum"]:.6f}')
+        lines.append(f'dmit_stage_duration_seconds_count{{{labels}}} {histogram["count"]}')
+    return '\n'.join(lines) + '\n'
+
+def write_atomic(path, text):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
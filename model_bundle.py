@@ -0,0 +1,230 @@
+"""
+Single-file bundle of the trained models.
+
+save_models() writes every model of a training run into one file, so a
+deploy replaces all of them at once and a loader opens one file instead of
+one pickle per model:
+
+    magic      4 bytes  b'DMTB'
+    version    uint8    1
+    length     uint32   manifest size
+    manifest   JSON     {'version', 'created', 'features', 'metrics', 'updates',
+                         'models': {name: {'offset', 'length', 'sha256'}}}
+    blobs      joblib pickles, back to back, offsets relative to the
+               end of the manifest
+
+The manifest is read with the header in one read; each model is only
+unpickled (and its checksum verified) the first time it is accessed. The
+bundle is written to a temporary file and renamed over models.bundle.
+Models the bundle does not hold (or every model, in directories without
+a bundle) still load from trained_model_<name>.pkl; save_models() removes
+the pickles of the models it bundles, so a retrain never leaves a stale
+copy behind. A compiled model set records the bundle version it was built
+from and is ignored once the bundle changes (see forest_engine.py), so
+packing a new bundle by hand is enough to switch to it.
+
+    python model_bundle.py pack <model_dir> <name> [<name> ...]
+    python model_bundle.py info <model_dir>
+"""
+import sys
+import io
+import json
+import os
+import time
+import struct
+import hashlib
+import threading
+from collections.abc import Mapping
+
+BUNDLE_FILE = 'models.bundle'
+MAGIC = b'DMTB'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('>4sBI')
+
+# First read of a bundle; covers the manifest of any realistic model set
+HEAD_READ = 64 * 1024
+
+def bundle_path(model_dir):
+    return os.path.join(model_dir, BUNDLE_FILE)
+
+def write_bundle(models, model_dir, features=None, metrics=None, updates=None):
+    """
+    Write models into model_dir/models.bundle atomically; returns the
+    manifest. metrics are those of the last full training, updates the
+    holdout comparisons of the incremental updates since.
+    """
+    import joblib
+    blobs, entries, offset = [], {}, 0
+    for name, model in models.items():
+        buffer = io.BytesIO()
+        joblib.dump(model, buffer)
+        blob = buffer.getvalue()
+        entries[name] = {'offset': offset, 'length': len(blob), 'sha256': hashlib.sha256(blob).hexdigest()}
+        blobs.append(blob)
+        offset += len(blob)
+
+    digest = hashlib.sha256(json.dumps(entries, sort_keys=True).encode())
+    manifest = {
+        'version': digest.hexdigest()[:16],
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'features': features,
+        'metrics': metrics or {},
+        'updates': updates or [],
+        'models': entries
+    }
+    head = json.dumps(manifest).encode()
+
+    os.makedirs(model_dir, exist_ok=True)
+    path = bundle_path(model_dir)
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(head)))
+        f.write(head)
+        for blob in blobs:
+            f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return manifest
+
+def read_manifest(f):
+    """Manifest and data offset of an open bundle"""
+    head = f.read(HEAD_READ)
+    if len(head) < HEADER.size:
+        raise ValueError("Truncated model bundle")
+    magic, version, length = HEADER.unpack_from(head)
+    if magic != MAGIC:
+        raise ValueError("Not a model bundle")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported model bundle version: {version}")
+    end = HEADER.size + length
+    if len(head) < end:
+        head += f.read(end - len(head))
+    return json.loads(head[HEADER.size:end]), end
+
+def bundle_version(model_dir):
+    """Version of the bundle of model_dir without loading any model, or None if it has none"""
+    try:
+        with open(bundle_path(model_dir), 'rb') as f:
+            return read_manifest(f)[0]['version']
+    except FileNotFoundError:
+        return None
+
+class ModelBundle(Mapping):
+    """Read-only {name: model} view of a bundle that unpickles each model on first access"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.manifest, self.data_offset = read_manifest(self.file)
+        self.version = self.manifest['version']
+        self.loaded = {}
+        self.extras = {}
+        self.lock = threading.Lock()
+
+    def add_models(self, models, tag):
+        """Serve models that are not in the bundle; tag identifies them in the version"""
+        self.extras.update(models)
+        self.version = f"{self.manifest['version']}+{tag}"
+
+    def __getitem__(self, name):
+        import joblib
+        if name in self.extras:
+            return self.extras[name]
+        with self.lock:
+            if name in self.loaded:
+                return self.loaded[name]
+            entry = self.manifest['models'][name]
+            # pread leaves the shared file offset alone, so forked workers can read the same handle
+            blob = os.pread(self.file.fileno(), entry['length'], self.data_offset + entry['offset'])
+            if len(blob) != entry['length'] or hashlib.sha256(blob).hexdigest() != entry['sha256']:
+                raise ValueError(f"Checksum mismatch for model {name} in {self.path}")
+            model = self.loaded[name] = joblib.load(io.BytesIO(blob))
+            return model
+
+    def __iter__(self):
+        yield from self.manifest['models']
+        yield from self.extras
+
+    def __len__(self):
+        return len(self.manifest['models']) + len(self.extras)
+
+    def __contains__(self, name):
+        return name in self.manifest['models'] or name in self.extras
+
+    @property
+    def metrics(self):
+        return self.manifest['metrics']
+
+    @property
+    def updates(self):
+        return self.manifest.get('updates', [])
+
+    def close(self):
+        """Release the bundle file; models already loaded stay usable"""
+        with self.lock:
+            self.file.close()
+
+def open_bundle(model_dir):
+    """The bundle of model_dir, or None if it has none"""
+    path = bundle_path(model_dir)
+    if not os.path.exists(path):
+        return None
+    return ModelBundle(path)
+
+def pickle_path(model_dir, name):
+    return os.path.join(model_dir, f'trained_model_{name}.pkl')
+
+def load_models(model_dir, names):
+    """
+    {name: model} for every name. Bundled models come from the bundle; only
+    the names it lacks are loaded from trained_model_<name>.pkl, and their
+    file stats become part of the version so cached predictions of a
+    replaced pickle are not reused.
+    """
+    import joblib
+    bundle = open_bundle(model_dir)
+    missing = [name for name in names if bundle is None or name not in bundle]
+    if not missing:
+        return bundle
+
+    models, stamp = {}, hashlib.sha256()
+    for name in missing:
+        path = pickle_path(model_dir, name)
+        try:
+            stat = os.stat(path)
+            models[name] = joblib.load(path)
+        except Exception as e:
+            raise RuntimeError(f"Failed to load {name} model: {str(e)}")
+        stamp.update(f'{name}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+    if bundle is None:
+        return models
+    bundle.add_models(models, stamp.hexdigest()[:8])
+    return bundle
+
+def remove_pickles(model_dir, names):
+    """Delete the trained_model_<name>.pkl files superseded by a bundle"""
+    for name in names:
+        try:
+            os.remove(pickle_path(model_dir, name))
+        except FileNotFoundError:
+            pass
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] not in ('pack', 'info') or (sys.argv[1] == 'pack' and len(sys.argv) < 4):
+        print("Usage: python model_bundle.py pack <model_dir> <name> [<name> ...] | info <model_dir>")
+        sys.exit(1)
+
+    import joblib
+    model_dir = sys.argv[2]
+    if sys.argv[1] == 'pack':
+        models = {name: joblib.load(pickle_path(model_dir, name)) for name in sys.argv[3:]}
+        metrics = {}
+        if os.path.exists(os.path.join(model_dir, 'model_metrics.json')):
+            with open(os.path.join(model_dir, 'model_metrics.json')) as f:
+                metrics = json.load(f)
+        manifest = write_bundle(models, model_dir, metrics=metrics)
+        print(f"Bundled {len(models)} models into {bundle_path(model_dir)} (version {manifest['version']})")
+    else:
+        with open(bundle_path(model_dir), 'rb') as f:
+            print(json.dumps(read_manifest(f)[0], indent=2))
@@ -0,0 +1,126 @@
+"""
+Memoized model predictions keyed on the quantized input row.
+
+Model inputs are mostly discrete (ridge counts, pattern codes, TFRC), so
+many tests produce the same row. Each row is keyed by the model-set
+version, the requested model names and the row quantized to a grid; a hit
+reuses the stored outputs of every model for that row and only the missing
+rows of a batch are evaluated.
+
+The quantized row is what gets evaluated, so a cached answer never depends
+on which test of a grid cell came first. With the default step of 0 rows
+are keyed on their float32 values, exactly what the compiled engine
+compares, and predictions are unchanged.
+
+Only versioned model sets (forest_engine.CompiledModelSet and
+model_bundle.ModelBundle) are cached; a plain dict of sklearn forests has
+no version to invalidate on, so it is always evaluated.
+
+    DMIT_PREDICTION_CACHE_ITEMS  rows kept, least recently used dropped first
+                                 (default 4096, 0 disables)
+    DMIT_PREDICTION_QUANTUM      grid step of the row values (default 0, exact)
+"""
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import forest_engine
+
+CACHE_ITEMS = int(os.environ.get('DMIT_PREDICTION_CACHE_ITEMS', 4096))
+QUANTUM = float(os.environ.get('DMIT_PREDICTION_QUANTUM', 0))
+
+COUNTERS = ['hits', 'misses', 'evictions']
+
+def quantize(X, quantum):
+    """Rows snapped to multiples of quantum, as float32"""
+    X = np.asarray(X, dtype=np.float64)
+    if quantum > 0:
+        X = np.round(X / quantum) * quantum
+    return X.astype(np.float32)
+
+class PredictionCache:
+    """LRU of per-row model outputs with hit/miss counters"""
+
+    def __init__(self, max_items=CACHE_ITEMS, quantum=QUANTUM):
+        self.max_items = max_items
+        self.quantum = quantum
+        self.rows = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def lookup(self, keys):
+        """Cached outputs per key, None for misses"""
+        with self.lock:
+            found = []
+            for key in keys:
+                outputs = self.rows.get(key)
+                if outputs is not None:
+                    self.rows.move_to_end(key)
+                found.append(outputs)
+            hits = sum(1 for outputs in found if outputs is not None)
+            self.counters['hits'] += hits
+            self.counters['misses'] += len(keys) - hits
+        return found
+
+    def store(self, entries):
+        with self.lock:
+            for key, outputs in entries:
+                self.rows[key] = outputs
+                self.rows.move_to_end(key)
+            while len(self.rows) > self.max_items:
+                self.rows.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def predict(self, models, X, names):
+        """forest_engine.predict_models() with every already-seen row answered from the cache"""
+        version = getattr(models, 'version', None)
+        if self.max_items <= 0 or version is None or not len(X):
+            return forest_engine.predict_models(models, X, names)
+
+        X = quantize(X, self.quantum)
+        prefix = (version, tuple(names))
+        keys = [prefix + (row.tobytes(),) for row in X]
+        found = self.lookup(keys)
+
+        missing = [i for i, outputs in enumerate(found) if outputs is None]
+        if missing:
+            computed = forest_engine.predict_models(models, X[missing], names)
+            entries = []
+            for j, i in enumerate(missing):
+                # One-row copies keep the dtype (object labels, float scores) for reassembly
+                # without pinning the whole batch output in memory
+                found[i] = {
+                    name: (output['value'][j:j + 1].copy(), None if output['proba'] is None else output['proba'][j:j + 1].copy())
+                    for name, output in computed.items()
+                }
+                entries.append((keys[i], found[i]))
+            self.store(entries)
+
+        return {
+            name: {
+                'value': np.concatenate([outputs[name][0] for outputs in found]),
+                'proba': None if found[0][name][1] is None else np.concatenate([outputs[name][1] for outputs in found])
+            }
+            for name in names
+        }
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters, items=len(self.rows), quantum=self.quantum)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Process-wide cache configured from the environment"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PredictionCache()
+        return _cache
+
+def predict_models(models, X, names):
+    return get_cache().predict(models, X, names)
@@ -40,26 +40,35 @@ if (count($fingerprints) !== 10) {
     exit();
 }
 
-// Update test status to processing
-$db->query("UPDATE tests SET status = 'processing' WHERE id = ?", [$test_id]);
+// Analyses run on the job queue workers (see job_queue.py); this page only enqueues and polls
+$queue = PYTHON_PATH . " " . escapeshellarg(dirname(PYTHON_SCRIPT) . "/job_queue.py");
+$job = json_decode((string)shell_exec("$queue status $test_id"), true);
 
-// Prepare data for Python script
-$finger_data = [];
-foreach ($fingerprints as $fp) {
-    $finger_data[$fp['finger_type']] = UPLOAD_DIR . $fp['file_path'];
-}
+if ($job && array_key_exists('state', $job) && $job['state'] === null) {
+    // Send the images as one binary frame on stdin (see framing.py)
+    $frame = pack('a4CJn', 'DMIT', 1, $test_id, count($fingerprints));
+    foreach ($fingerprints as $fp) {
+        $image = (string)file_get_contents(UPLOAD_DIR . $fp['file_path']);
+        $frame .= pack('n', strlen($fp['finger_type'])) . $fp['finger_type'] . pack('N', strlen($image)) . $image;
+    }
 
-// Save as JSON for Python script
-$json_file = UPLOAD_DIR . "test_{$test_id}_data.json";
-file_put_contents($json_file, json_encode([
-    'test_id' => $test_id,
-    'fingerprints' => $finger_data
-]));
+    $output = '';
+    $process = proc_open("$queue enqueue --pipeline basic", [0 => ['pipe', 'r'], 1 => ['pipe', 'w']], $pipes);
+    if (is_resource($process)) {
+        fwrite($pipes[0], $frame);
+        fclose($pipes[0]);
+        $output = stream_get_contents($pipes[1]);
+        fclose($pipes[1]);
+        proc_close($process);
+    }
+    $job = json_decode($output, true);
+}
 
-// Execute Python script
-$command = PYTHON_PATH." " . PYTHON_SCRIPT . " " . escapeshellarg($json_file);
-$output = shell_exec($command);
-$result = json_decode($output, true);
+// A completed job's status is written together with its results below
+if ($job && isset($job['test_status']) && $job['test_status'] !== 'completed') {
+    $db->query("UPDATE tests SET status = ? WHERE id = ?", [$job['test_status'], $test_id]);
+}
+$result = ($job && ($job['state'] ?? null) === 'completed') ? $job['result'] : null;
 
 if ($result && isset($result['success']) && $result['success']) {
     // Save analysis results
@@ -120,10 +129,19 @@ if ($result && isset($result['success']) && $result['success']) {
     // Redirect to report
     header("Location: report.php?id=$test_id");
     exit();
-} else {
+} elseif (!$job || !isset($job['test_status'])) {
+    // Queue unavailable or full
+    $error = "The analysis queue is busy. Please try again in a moment.";
+} elseif ($job['state'] === 'failed') {
     // Analysis failed
-    $db->query("UPDATE tests SET status = 'failed' WHERE id = ?", [$test_id]);
     $error = "Analysis failed. Please try again.";
+    if (!empty($job['result']['rejections'])) {
+        $error = "Some fingerprint images could not be used: " . implode(', ', array_map(
+            function ($finger, $rejection) { return str_replace('_', ' ', $finger) . " (" . $rejection['message'] . ")"; },
+            array_keys($job['result']['rejections']),
+            $job['result']['rejections']
+        ));
+    }
 }
 ?>
 
@@ -0,0 +1,125 @@
+"""
+Cheap usability check of fingerprint images before feature extraction.
+
+Each resized finger is shrunk to a PREVIEW_SIZE square (INTER_AREA) and
+measured in about a millisecond. The print area is the set of 8x8 blocks
+whose standard deviation shows texture; the histogram and the spectrum
+only look at it, so a small print on a white scanner bed is judged by the
+print, not by the empty bed around it:
+
+    foreground    share of the frame covered by the print area
+    histogram     spread between the 2nd and 98th intensity percentile and
+                  the share of saturated white / black pixels of the print
+                  area (of the whole frame when no block is textured)
+    ridges        share of the non-DC spectral energy held by the strongest
+                  2% of coefficients in the ridge band (periods of 5 to 40
+                  pixels at 500x500), with everything outside the print
+                  area flattened to its mean; ridges are a narrow periodic
+                  peak, noise spreads its energy
+
+A finger fails on the first check it misses, with one of the reasons
+underexposed, overexposed, low_contrast, no_print or no_ridges. Every
+finger of the test is checked, so one error lists all unusable uploads.
+The pipelines run the gate on the decoded images, before the contour
+analysis and before any model is loaded; fingers answered from the feature
+cache skip it.
+
+The thresholds are only calibrated on synthetic prints, so the gate is off
+until it has been checked against real scans:
+
+    DMIT_QUALITY_GATE  1 enables the check (default 0)
+"""
+import os
+import cv2
+import numpy as np
+
+ENABLED = os.environ.get('DMIT_QUALITY_GATE') == '1'
+
+PREVIEW_SIZE = 128
+BLOCK = 8
+
+# Calibrated on the benchmark corpus and on its prints shrunk to 10-50% of
+# a white frame (worst good value in brackets) against blank, black,
+# blurred, overexposed, gradient, noise and text uploads
+SATURATED_FRACTION = 0.6      # white plus black pixels of the print area (good: 0.25)
+MIN_RANGE = 32                # p98 - p2 intensity (good: 83)
+BLOCK_STD = 8.0
+MIN_FOREGROUND = 0.1          # textured blocks (good: 0.14)
+MIN_RIDGE_PEAK = 0.12         # ridge band peak energy (good: 0.2; ridges finer than
+                              # the band, as in very large scans, fail below ~30% cover)
+
+MESSAGES = {
+    'underexposed': "Image is too dark to show ridges",
+    'overexposed': "Image is too bright to show ridges",
+    'low_contrast': "Image has too little contrast to show ridges",
+    'no_print': "No fingerprint found in the image",
+    'no_ridges': "No ridge pattern found in the image"
+}
+
+class ImageRejected(ValueError):
+    """Raised when fingers fail the gate; rejections maps finger to {'reason', 'message'}"""
+
+    def __init__(self, rejections):
+        self.rejections = rejections
+        listed = ', '.join(f"{finger} ({rejection['reason']})" for finger, rejection in rejections.items())
+        super().__init__(f"Unusable fingerprint images: {listed}")
+
+def _spectrum_masks(size):
+    radius = np.hypot(np.fft.fftfreq(size)[:, None], np.fft.rfftfreq(size)[None, :])
+    scale = size / 500.0
+    band = (radius >= 1 / (40 * scale)) & (radius <= min(0.5, 1 / (5 * scale)))
+    window = np.outer(np.hanning(size), np.hanning(size)).astype(np.float32)
+    return radius > 0, band, window
+
+_NON_DC, _BAND, _WINDOW = _spectrum_masks(PREVIEW_SIZE)
+
+def measure(image):
+    """Quality measurements of one grayscale image"""
+    preview = cv2.resize(image, (PREVIEW_SIZE, PREVIEW_SIZE), interpolation=cv2.INTER_AREA)
+    blocks = preview.reshape(PREVIEW_SIZE // BLOCK, BLOCK, PREVIEW_SIZE // BLOCK, BLOCK).astype(np.float32)
+    textured = blocks.std(axis=(1, 3)) > BLOCK_STD
+    mask = np.repeat(np.repeat(textured, BLOCK, axis=0), BLOCK, axis=1)
+    area = preview[mask] if textured.any() else preview.ravel()
+
+    histogram = np.bincount(area, minlength=256)
+    cumulative = np.cumsum(histogram) / area.size
+    spread = int(np.searchsorted(cumulative, 0.98)) - int(np.searchsorted(cumulative, 0.02))
+
+    # Flatten the background so the border of the print adds no spectral energy
+    fill = float(area.mean())
+    centered = np.where(mask, preview.astype(np.float32), fill) - fill
+    power = np.abs(np.fft.rfft2(centered * _WINDOW)) ** 2
+    total = float(power[_NON_DC].sum())
+    band = np.sort(power[_BAND])[::-1]
+    top = max(1, len(band) // 50)
+    ridge_peak = float(band[:top].sum()) / total if total > 0 else 0.0
+
+    return {
+        'range': spread,
+        'white': float(histogram[250:].sum()) / area.size,
+        'black': float(histogram[:6].sum()) / area.size,
+        'foreground': float(textured.mean()),
+        'ridge_peak': ridge_peak
+    }
+
+def rejection_reason(measured):
+    """Reason code of an unusable image, None when it passes"""
+    if measured['white'] + measured['black'] > SATURATED_FRACTION:
+        return 'overexposed' if measured['white'] >= measured['black'] else 'underexposed'
+    if measured['range'] < MIN_RANGE:
+        return 'low_contrast'
+    if measured['foreground'] < MIN_FOREGROUND:
+        return 'no_print'
+    if measured['ridge_peak'] < MIN_RIDGE_PEAK:
+        return 'no_ridges'
+    return None
+
+def check(images):
+    """Raise ImageRejected listing every unusable image of {finger: resized image}"""
+    rejections = {}
+    for finger, image in images.items():
+        reason = rejection_reason(measure(image))
+        if reason is not None:
+            rejections[finger] = {'reason': reason, 'message': MESSAGES[reason]}
+    if rejections:
+        raise ImageRejected(rejections)
@@ -0,0 +1,216 @@
+"""
+Resumable bulk re-scoring of historical tests.
+
+Streams a JSONL manifest of `{test_id, fingerprints}` payloads through a
+process pool, scores them in small batches (models are loaded once per
+worker) and appends one NDJSON result per test to the output file, in
+manifest order. After every written batch a checkpoint records the next
+manifest line and the output size, so an interrupted run picks up exactly
+where it stopped. At most a few batches are in flight, so memory stays
+flat whatever the manifest size.
+
+    python rescore.py --manifest tests.jsonl --output results.ndjson
+        [--pipeline full|basic] [--workers N] [--batch-size N]
+        [--shard I/N] [--checkpoint PATH] [--model-dir DIR] [--fresh]
+
+--shard I/N keeps only the tests whose crc32(test_id) % N == I, so N
+machines can share one manifest. --model-dir scores against a freshly
+trained model directory instead of the deployed one.
+
+export_reports.py turns the output into a typed Parquet or Arrow file.
+"""
+import sys
+import json
+import os
+import time
+import zlib
+import importlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+USAGE = ("Usage: python rescore.py --manifest <jsonl> --output <ndjson> [--pipeline full|basic] "
+         "[--workers N] [--batch-size N] [--shard I/N] [--checkpoint PATH] [--model-dir DIR] [--fresh]")
+
+PIPELINES = {
+    'full': 'full_model_based_analysis',
+    'basic': 'analysis'
+}
+
+_pipeline = None
+_models = None
+
+def init_worker(pipeline, model_dir=None):
+    """Load the pipeline and its models once per worker process"""
+    global _pipeline, _models
+    if 'DMIT_EXTRACT_WORKERS' not in os.environ:
+        # The process pool already keeps every core busy
+        os.environ['DMIT_EXTRACT_WORKERS'] = '1'
+    _pipeline = importlib.import_module(PIPELINES[pipeline])
+    if model_dir:
+        _pipeline.MODEL_DIR = model_dir
+    try:
+        _models = _pipeline.load_models()
+    except Exception:
+        # run_analysis_batch retries the load and reports the error per test
+        _models = None
+
+def score_batch(payloads):
+    """Score one batch; unparseable manifest lines become error results in place"""
+    valid = [payload for payload in payloads if not is_invalid(payload)]
+    scored = iter(_pipeline.run_analysis_batch(valid, _models) if valid else [])
+    return [
+        {"status": "error", "message": payload['invalid'], "test_id": -1} if is_invalid(payload) else next(scored)
+        for payload in payloads
+    ]
+
+def is_invalid(payload):
+    return isinstance(payload, dict) and 'invalid' in payload and 'fingerprints' not in payload
+
+def in_shard(test_id, shard):
+    index, count = shard
+    return zlib.crc32(str(test_id).encode()) % count == index
+
+def parse_shard(value):
+    index, _, count = value.partition('/')
+    index, count = int(index), int(count)
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard: {value}")
+    return index, count
+
+def read_manifest(path, start_line, shard):
+    """Yield (line_number, payload) from start_line on, skipping other shards"""
+    with open(path, 'r') as f:
+        for line_number, line in enumerate(f):
+            if line_number < start_line or not line.strip():
+                continue
+            try:
+                payload = json.loads(line)
+            except ValueError as e:
+                payload = {'test_id': -1, 'invalid': f"Invalid manifest line {line_number + 1}: {e}"}
+            if shard and not in_shard(payload.get('test_id', -1) if isinstance(payload, dict) else -1, shard):
+                continue
+            yield line_number, payload
+
+def batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def load_checkpoint(path, manifest, shard):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('manifest') != os.path.abspath(manifest) or checkpoint.get('shard') != list(shard or []):
+        raise ValueError(f"Checkpoint {path} belongs to a different manifest or shard; use --fresh to start over")
+    return checkpoint
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def rescore(manifest, output, pipeline='full', workers=None, batch_size=16, shard=None, checkpoint_path=None,
+            fresh=False, model_dir=None):
+    """Score every manifest entry of this shard; returns a summary dict"""
+    checkpoint_path = checkpoint_path or output + '.checkpoint'
+    checkpoint = None if fresh else load_checkpoint(checkpoint_path, manifest, shard)
+    if checkpoint is None:
+        checkpoint = {
+            'manifest': os.path.abspath(manifest),
+            'shard': list(shard or []),
+            'next_line': 0,
+            'output_bytes': 0,
+            'scored': 0,
+            'errors': 0
+        }
+
+    workers = workers or os.cpu_count() or 1
+    started = time.time()
+
+    # Drop results written after the last checkpoint; they are recomputed
+    out = open(output, 'r+b' if os.path.exists(output) else 'wb')
+    out.truncate(checkpoint['output_bytes'])
+    out.seek(checkpoint['output_bytes'])
+
+    def write(batch, results):
+        for result in results:
+            out.write((json.dumps(result) + '\n').encode())
+            checkpoint['scored'] += 1
+            if result.get('status') == 'error':
+                checkpoint['errors'] += 1
+        out.flush()
+        os.fsync(out.fileno())
+        checkpoint['next_line'] = batch[-1][0] + 1
+        checkpoint['output_bytes'] = out.tell()
+        save_checkpoint(checkpoint_path, checkpoint)
+
+    with out, ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(pipeline, model_dir)) as pool:
+        pending = deque()
+        for batch in batches(read_manifest(manifest, checkpoint['next_line'], shard), batch_size):
+            pending.append((batch, pool.submit(score_batch, [payload for _, payload in batch])))
+
+            # Bounded window: write finished batches in order before reading further
+            while len(pending) > workers * 2:
+                done_batch, future = pending.popleft()
+                write(done_batch, future.result())
+
+        while pending:
+            done_batch, future = pending.popleft()
+            write(done_batch, future.result())
+
+    return {
+        'scored': checkpoint['scored'],
+        'errors': checkpoint['errors'],
+        'next_line': checkpoint['next_line'],
+        'seconds': round(time.time() - started, 2)
+    }
+
+def main(argv):
+    options = {
+        '--manifest': None, '--output': None, '--pipeline': 'full', '--workers': None,
+        '--batch-size': '16', '--shard': None, '--checkpoint': None, '--model-dir': None
+    }
+    fresh = False
+    args = list(argv)
+    while args:
+        flag = args.pop(0)
+        if flag == '--fresh':
+            fresh = True
+            continue
+        if flag not in options or not args:
+            raise ValueError(USAGE)
+        options[flag] = args.pop(0)
+
+    if not options['--manifest'] or not options['--output']:
+        raise ValueError(USAGE)
+    if options['--pipeline'] not in PIPELINES:
+        raise ValueError(f"Unknown pipeline: {options['--pipeline']}")
+
+    summary = rescore(
+        options['--manifest'],
+        options['--output'],
+        pipeline=options['--pipeline'],
+        workers=int(options['--workers']) if options['--workers'] else None,
+        batch_size=int(options['--batch-size']),
+        shard=parse_shard(options['--shard']) if options['--shard'] else None,
+        checkpoint_path=options['--checkpoint'],
+        fresh=fresh,
+        model_dir=options['--model-dir']
+    )
+    print(json.dumps(summary))
+
+if __name__ == '__main__':
+    try:
+        main(sys.argv[1:])
+    except Exception as e:
+        print(json.dumps({"status": "error", "message": str(e)}))
+        sys.exit(1)
@@ -0,0 +1,82 @@
+"""
+Deferred imports for the CLI entry points.
+
+Heavy modules (cv2, numpy, joblib, sklearn through the pickles) are only
+imported on first attribute access, so usage errors and cache-only runs
+never pay for them. Every deferred import is timed for --startup-report.
+"""
+import sys
+import json
+import atexit
+import time
+import importlib
+import threading
+
+STARTED = time.perf_counter()
+
+# Packages worth naming in the report when a deferred import drags them in
+HEAVY_PACKAGES = ['numpy', 'cv2', 'joblib', 'sklearn', 'scipy', 'pandas']
+
+_timings = {}
+_lock = threading.Lock()
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            module = self._load()
+        return getattr(module, attr)
+
+    def _load(self):
+        already_loaded = self._name in sys.modules
+        heavy_before = [name for name in HEAVY_PACKAGES if name in sys.modules]
+        start = time.perf_counter()
+        module = importlib.import_module(self._name)
+        elapsed = time.perf_counter() - start
+        with _lock:
+            if not already_loaded and self._name not in _timings:
+                pulled_in = [name for name in HEAVY_PACKAGES if name in sys.modules and name not in heavy_before and name != self._name]
+                _timings[self._name] = (elapsed, pulled_in)
+        self._module = module
+        return module
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'deferred'
+        return f"<lazy module '{self._name}' ({state})>"
+
+def lazy_import(name):
+    return LazyModule(name)
+
+def report():
+    """Import time per deferred module, in import order, plus totals in ms"""
+    with _lock:
+        modules = {
+            name: {'ms': round(seconds * 1000, 2), 'pulled_in': pulled_in}
+            for name, (seconds, pulled_in) in _timings.items()
+        }
+    return {
+        'modules': modules,
+        'import_ms': round(sum(m['ms'] for m in modules.values()), 2),
+        'heavy_loaded': [name for name in HEAVY_PACKAGES if name in sys.modules],
+        'elapsed_ms': round((time.perf_counter() - STARTED) * 1000, 2)
+    }
+
+def print_report(stream=None):
+    print(json.dumps({'startup_report': report()}), file=stream or sys.stderr)
+
+def install_report(argv, flag='--startup-report'):
+    """
+    Remove --startup-report from argv in place and, if it was given, print
+    the report to stderr when the process exits (stdout stays pure JSON).
+    """
+    if flag not in argv:
+        return False
+    argv.remove(flag)
+    atexit.register(print_report)
+    return True
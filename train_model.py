@@ -3,19 +3,49 @@ import numpy as np
 from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, mean_squared_error
-import joblib
+import sys
 import os
 import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import forest_engine
+import training_store
+import model_bundle
 
 MODEL_DIR = os.path.join('/var/www/dmittest/public/ai_models')
 DATA_PATH = os.path.join(MODEL_DIR, 'training_data.csv')
+MODEL_CONFIG_FILE = 'model_config.json'
 
-def load_and_preprocess_data():
+# Typed .npy copy of the training CSV (see training_store.py); bump the
+# version whenever fill_defaults changes its output
+TRAINING_STORE = os.environ.get('DMIT_TRAINING_STORE', '1') != '0'
+PREPROCESS_VERSION = 'train-1'
+
+# Cores available to training (model processes x tree threads)
+TRAIN_CORES = int(os.environ.get('DMIT_TRAIN_CORES', os.cpu_count() or 1))
+
+# Incremental mode: history rows sampled per new row to train the added trees
+HISTORY_RATIO = 4
+# Fewest new rows an incremental update is evaluated on (a fifth is held out)
+MIN_NEW_ROWS = 5
+
+USAGE = "Usage: python train_model.py [--incremental <new_rows.csv> [--trees N] [--tolerance F] [--force]]"
+
+def load_and_preprocess_data(columns=None):
+    """Training data, or only the given columns of it"""
     if not os.path.exists(DATA_PATH):
         raise FileNotFoundError(f"Training data not found at {DATA_PATH}")
 
-    df = pd.read_csv(DATA_PATH)
+    if not TRAINING_STORE:
+        df = preprocess(pd.read_csv(DATA_PATH))
+        return df if columns is None else df[list(columns)]
+    return parse_swot(training_store.load(DATA_PATH, PREPROCESS_VERSION, fill_defaults, columns))
 
+def preprocess(df):
+    return parse_swot(fill_defaults(df))
+
+def fill_defaults(df):
     # Fill missing values with reasonable defaults
     df.fillna({
         'right_palm_atd_angle': 45.0,
@@ -47,29 +77,48 @@ def load_and_preprocess_data():
     for field in categorical_fields:
         df[field] = df[field].astype(str)
 
+    return df
+
+def parse_swot(df):
     # Parse SWOT analysis if it's a string
-    if isinstance(df['swot_analysis'].iloc[0], str):
+    if 'swot_analysis' in df and isinstance(df['swot_analysis'].iloc[0], str):
         df['swot_analysis'] = df['swot_analysis'].apply(json.loads)
 
     return df
 
-def train_models(df):
+FINGERS = [
+    'right_thumb', 'right_index', 'right_middle', 'right_ring', 'right_pinky',
+    'left_thumb', 'left_index', 'left_middle', 'left_ring', 'left_pinky'
+]
+
+CLASSIFIERS = ['personality', 'learning', 'holland', 'sensing', 'thought', 'psych', 'leadership']
+
+def feature_columns():
     # Define fingerprint features
     feature_cols = []
-    fingers = [
-        'right_thumb', 'right_index', 'right_middle', 'right_ring', 'right_pinky',
-        'left_thumb', 'left_index', 'left_middle', 'left_ring', 'left_pinky'
-    ]
-    for finger in fingers:
+    for finger in FINGERS:
         feature_cols.extend([
             f'{finger}_ridge_count',
             f'{finger}_pattern_type',
             f'{finger}_circularity'
         ])
     feature_cols.extend(['tfrc', 'atd_angle'])
+    return feature_cols
+
+def target_columns():
+    return [
+        'personality_type', 'disc_D', 'disc_I', 'disc_S', 'disc_C', 'learning_style', 'holland_code',
+        'logical_mathematical', 'verbal_linguistic', 'naturalistic', 'visual_spatial', 'bodily_kinesthetic',
+        'musical', 'interpersonal', 'intrapersonal', 'sensing_capability', 'thought_process',
+        'psychological_capability', 'leadership_style'
+    ]
+
+def model_columns():
+    """Every column the models are trained on or against"""
+    return feature_columns() + target_columns()
 
-    X = df[feature_cols].values
-    y = {
+def build_targets(df):
+    return {
         'personality': df['personality_type'].values,
         'disc': df[['disc_D', 'disc_I', 'disc_S', 'disc_C']].values,
         'learning': df['learning_style'].values,
@@ -83,11 +132,7 @@ def train_models(df):
         'leadership': df['leadership_style'].values
     }
 
-    # Split data
-    train_indices, test_indices = train_test_split(np.arange(len(X)), test_size=0.2, random_state=42)
-    X_train, X_test = X[train_indices], X[test_indices]
-
-    # Initialize and train models
+def build_models():
     models = {
         'personality': RandomForestClassifier(n_estimators=150, max_depth=10, random_state=42),
         'disc': RandomForestRegressor(n_estimators=100, random_state=42),
@@ -100,31 +145,116 @@ def train_models(df):
         'leadership': RandomForestClassifier(n_estimators=50, random_state=42)
     }
 
+    # Tree counts and depths picked with tune_models.py override the defaults
+    config_path = os.path.join(MODEL_DIR, MODEL_CONFIG_FILE)
+    if os.path.exists(config_path):
+        with open(config_path) as f:
+            for name, params in json.load(f).items():
+                if name in models:
+                    models[name].set_params(**params)
+    return models
+
+def build_test_data(X_test, y, test_indices):
+    test_data = {'X_test': X_test}
+    for name, values in y.items():
+        test_data[f'y_{name}'] = values[test_indices]
+    return test_data
+
+def train_models(df):
+    X = df[feature_columns()].values
+    y = build_targets(df)
+
+    # Split data
+    train_indices, test_indices = train_test_split(np.arange(len(X)), test_size=0.2, random_state=42)
+    X_train, X_test = X[train_indices], X[test_indices]
+
+    # Initialize and train models
+    models = build_models()
+    targets = {name: y[name][train_indices] for name in models}
+    models, report = fit_models(models, X_train, targets, TRAIN_CORES)
+    for name, fit in report.items():
+        print(f"  {name}: {fit['seconds']:.2f}s (n_jobs={fit['n_jobs']})")
+
+    return models, build_test_data(X_test, y, test_indices)
+
+def plan_training(models, cores):
+    """
+    Split a core budget between model-level and tree-level parallelism.
+    Returns the number of worker processes and n_jobs per model: one
+    process per model up to the budget, and any cores left over go to the
+    tree threads of each model in proportion to its tree count.
+    """
+    workers = max(1, min(cores, len(models)))
+    spare = max(0, cores - workers)
+    total_trees = sum(model.n_estimators for model in models.values())
+    n_jobs = {name: 1 + spare * model.n_estimators // total_trees for name, model in models.items()}
+    return workers, n_jobs
+
+def fit_shared(name, model, shm_name, shape, dtype, y_train):
+    """Fit one model in a worker on the X_train matrix in shared memory"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        X_train = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        start = time.perf_counter()
+        model.fit(X_train, y_train)
+        seconds = time.perf_counter() - start
+        del X_train
+    finally:
+        shm.close()
+    return name, model, seconds
+
+def fit_models(models, X_train, targets, cores=TRAIN_CORES):
+    """
+    Fit all models concurrently within a core budget.
+    X_train is placed once in shared memory as float32, the dtype the
+    forests train on anyway, so workers neither unpickle nor convert it and
+    the fitted models match a sequential fit. Returns the fitted models and
+    the wall-clock seconds of each fit.
+    """
+    workers, n_jobs = plan_training(models, cores)
     for name, model in models.items():
-        model.fit(X_train, y[name][train_indices])
-
-    # Prepare test data
-    test_data = {
-        'X_test': X_test,
-        'y_personality': y['personality'][test_indices],
-        'y_disc': y['disc'][test_indices],
-        'y_learning': y['learning'][test_indices],
-        'y_holland': y['holland'][test_indices],
-        'y_mi': y['mi'][test_indices],
-        'y_sensing': y['sensing'][test_indices],
-        'y_thought': y['thought'][test_indices],
-        'y_psych': y['psych'][test_indices],
-        'y_leadership': y['leadership'][test_indices]
-    }
+        model.set_params(n_jobs=n_jobs[name])
 
-    return models, test_data
+    X_train = np.ascontiguousarray(X_train, dtype=np.float32)
+    if workers == 1:
+        seconds = {}
+        for name, model in models.items():
+            start = time.perf_counter()
+            model.fit(X_train, targets[name])
+            seconds[name] = time.perf_counter() - start
+        return finish_fit(models, seconds, n_jobs)
+
+    shm = shared_memory.SharedMemory(create=True, size=X_train.nbytes)
+    try:
+        np.ndarray(X_train.shape, dtype=X_train.dtype, buffer=shm.buf)[:] = X_train
+        # Largest forests first, so the longest fits do not start last
+        order = sorted(models, key=lambda name: models[name].n_estimators, reverse=True)
+        fitted, seconds = {}, {}
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(fit_shared, name, models[name], shm.name, X_train.shape, X_train.dtype, targets[name])
+                for name in order
+            ]
+            for future in as_completed(futures):
+                name, model, elapsed = future.result()
+                fitted[name], seconds[name] = model, elapsed
+    finally:
+        shm.close()
+        shm.unlink()
+    return finish_fit({name: fitted[name] for name in models}, seconds, n_jobs)
+
+def finish_fit(models, seconds, n_jobs):
+    # Saved models predict single rows; tree threads would only add overhead there
+    for model in models.values():
+        model.set_params(n_jobs=None)
+    return models, {name: {'seconds': seconds[name], 'n_jobs': n_jobs[name]} for name in models}
 
 def evaluate_models(models, test_data):
     metrics = {}
     X_test = test_data['X_test']
 
     # Classification metrics
-    for name in ['personality', 'learning', 'holland', 'sensing', 'thought', 'psych', 'leadership']:
+    for name in CLASSIFIERS:
         pred = models[name].predict(X_test)
         metrics[f'{name}_accuracy'] = accuracy_score(test_data[f'y_{name}'], pred)
 
@@ -137,21 +267,192 @@ def evaluate_models(models, test_data):
 
     return metrics
 
-def save_models(models, metrics):
+def save_models(models, metrics, updates=None):
     os.makedirs(MODEL_DIR, exist_ok=True)
     
-    # Save all models
-    for name, model in models.items():
-        joblib.dump(model, os.path.join(MODEL_DIR, f'trained_model_{name}.pkl'))
+    # Save all models, with the feature schema and metrics, as one bundle
+    manifest = model_bundle.write_bundle(models, MODEL_DIR, feature_columns(), metrics, updates)
+    # The bundle supersedes the per-model pickles of older deployments
+    model_bundle.remove_pickles(MODEL_DIR, models)
     
-    # Save metrics
-    with open(os.path.join(MODEL_DIR, 'model_metrics.json'), 'w') as f:
-        json.dump(metrics, f, indent=2)
+    # Export flattened node arrays for the sklearn-free inference engine
+    forest_engine.save_compiled(models, MODEL_DIR, manifest['version'])
+
+def load_current_models():
+    return model_bundle.load_models(MODEL_DIR, list(build_models()))
+
+def compare_metrics(candidate, current, tolerance):
+    """
+    Metrics of the candidate that are worse than the current ones beyond
+    tolerance: accuracies by an absolute drop, MSEs by a relative increase.
+    """
+    regressions = {}
+    for name, value in candidate.items():
+        if name not in current:
+            continue
+        if name.endswith('_accuracy'):
+            worse = value < current[name] - tolerance
+        else:
+            worse = value > current[name] * (1 + tolerance)
+        if worse:
+            regressions[name] = {'current': current[name], 'candidate': value}
+    return regressions
+
+def append_training_rows(raw_rows):
+    """Append rows, as read from CSV, to the training data in its column order"""
+    columns = pd.read_csv(DATA_PATH, nrows=0).columns
+    with open(DATA_PATH, 'rb+') as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b'\n':
+            f.write(b'\n')
+    raw_rows.reindex(columns=columns).to_csv(DATA_PATH, mode='a', header=False, index=False)
+
+def class_coverage(history, models, sample):
+    """History rows that give the sample every class the classifiers already know"""
+    y_history, y_sample = build_targets(history), build_targets(sample)
+    rows = []
+    for name in CLASSIFIERS:
+        if name not in models:
+            continue
+        for label in set(models[name].classes_) - set(y_sample[name]):
+            rows.append(int(np.flatnonzero(y_history[name] == label)[0]))
+    return history.iloc[sorted(set(rows))]
+
+def update_models(new, history, models, extra_trees=None):
+    """
+    Grow the current forests with trees fitted on the new rows plus a sample
+    of the history (HISTORY_RATIO rows per new row), so the cost follows the
+    new data. Classifiers whose new rows bring unseen classes cannot be grown
+    and are rebuilt on the full data instead. Returns the candidate models
+    and the names of the rebuilt ones.
+    """
+    y_new = build_targets(new)
+    rebuilt = [name for name in CLASSIFIERS if set(y_new[name]) - set(models[name].classes_)]
+    candidates = dict(models)
 
-def main():
+    if rebuilt:
+        full = pd.concat([history, new], ignore_index=True)
+        y_full = build_targets(full)
+        fresh = {name: build_models()[name] for name in rebuilt}
+        fitted, report = fit_models(fresh, full[feature_columns()].values, {name: y_full[name] for name in rebuilt})
+        candidates.update(fitted)
+        for name, fit in report.items():
+            print(f"  {name}: rebuilt in {fit['seconds']:.2f}s (new classes)")
+
+    grown = {name: model for name, model in models.items() if name not in rebuilt}
+    if not grown:
+        return candidates, rebuilt
+
+    sample = history.sample(min(len(history), HISTORY_RATIO * len(new)), random_state=42)
+    sample = pd.concat([sample, class_coverage(history, grown, sample)])
+    data = pd.concat([new, sample], ignore_index=True)
+    y_data = build_targets(data)
+    for model in grown.values():
+        trees = extra_trees or max(1, int(np.ceil(model.n_estimators * len(new) / max(1, len(history)))))
+        model.set_params(warm_start=True, n_estimators=model.n_estimators + trees)
+
+    fitted, report = fit_models(grown, data[feature_columns()].values, {name: y_data[name] for name in grown})
+    for name, model in fitted.items():
+        model.set_params(warm_start=False)
+        print(f"  {name}: {model.n_estimators} trees, {report[name]['seconds']:.2f}s")
+    candidates.update(fitted)
+    return candidates, rebuilt
+
+def retrain_incremental(new_path, extra_trees=None, tolerance=0.05, force=False):
+    """
+    Grow the models with new rows and promote them if they hold up against
+    the current models on the same held-out new rows. The rows are only
+    appended to the training data once the grown models are saved, so a
+    rejected or failed run can simply be repeated. The bundle keeps the
+    metrics of the last full training; the holdout comparison, which may
+    cover only a few rows, is added to its updates.
+    """
+    raw_rows = pd.read_csv(new_path)
+    new = preprocess(raw_rows.copy())
+    if len(new) < MIN_NEW_ROWS:
+        print(f"Only {len(new)} new rows; at least {MIN_NEW_ROWS} are needed to evaluate an update")
+        return False
+
+    history = load_and_preprocess_data(model_columns())
+    models = load_current_models()
+
+    train_indices, test_indices = train_test_split(np.arange(len(new)), test_size=0.2, random_state=42)
+    holdout = new.iloc[test_indices]
+    test_data = build_test_data(holdout[feature_columns()].values, build_targets(holdout), np.arange(len(holdout)))
+    # Before growing: a sequential fit grows the current forests in place
+    baseline = evaluate_models(models, test_data)
+
+    print(f"Growing models with {len(train_indices)} new rows...")
+    candidates, rebuilt = update_models(new.iloc[train_indices], history, models, extra_trees)
+    metrics = evaluate_models(candidates, test_data)
+    regressions = compare_metrics(metrics, baseline, tolerance)
+
+    if regressions and not force:
+        print("Not promoting; metrics regressed against the current models on the held-out rows:")
+        for name, values in regressions.items():
+            print(f"  {name}: {values['current']:.4f} -> {values['candidate']:.4f}")
+        return False
+
+    update = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'rows': len(new),
+        'holdout_rows': len(test_indices),
+        'current': baseline,
+        'candidate': metrics,
+        'rebuilt': rebuilt
+    }
+    print("Saving models...")
+    save_models(candidates, getattr(models, 'metrics', {}), getattr(models, 'updates', []) + [update])
+    append_training_rows(raw_rows)
+    print(f"Appended {len(raw_rows)} rows to {DATA_PATH}")
+    if rebuilt:
+        print(f"Rebuilt on the full data (new classes): {', '.join(rebuilt)}")
+    print(f"\nIncremental update complete! Metrics on {len(test_indices)} held-out new rows:")
+    print_metrics(metrics)
+    return True
+
+def parse_args(argv):
+    """None for a full retrain, else the options of --incremental"""
+    args = list(argv)
+    if not args:
+        return None
+    options = {'--trees': None, '--tolerance': '0.05', '--force': False}
+    if '--force' in args:
+        args.remove('--force')
+        options['--force'] = True
+    if len(args) < 2 or args[0] != '--incremental':
+        raise ValueError(USAGE)
+    options['--incremental'] = args[1]
+    args = args[2:]
+    while args:
+        flag = args.pop(0)
+        if flag not in ('--trees', '--tolerance') or not args:
+            raise ValueError(USAGE)
+        options[flag] = args.pop(0)
+    return options
+
+def print_metrics(metrics):
+    for name, value in metrics.items():
+        if name.endswith('_accuracy'):
+            print(f"{name.replace('_', ' ').title()}: {value:.2%}")
+        else:
+            print(f"{name.replace('_', ' ').title()}: {value:.2f}")
+
+def main(argv):
+    options = parse_args(argv)
     try:
+        if options:
+            promoted = retrain_incremental(
+                options['--incremental'],
+                int(options['--trees']) if options['--trees'] else None,
+                float(options['--tolerance']),
+                options['--force']
+            )
+            # 2 tells a scheduler that the models were kept and the rows not stored
+            sys.exit(0 if promoted else 2)
+
         print("Loading training data...")
-        df = load_and_preprocess_data()
+        df = load_and_preprocess_data(model_columns())
 
         print("Training models...")
         models, test_data = train_models(df)
@@ -163,15 +464,11 @@ def main():
         save_models(models, metrics)
 
         print("\nTraining complete! Model metrics:")
-        for name, value in metrics.items():
-            if name.endswith('_accuracy'):
-                print(f"{name.replace('_', ' ').title()}: {value:.2%}")
-            else:
-                print(f"{name.replace('_', ' ').title()}: {value:.2f}")
+        print_metrics(metrics)
 
     except Exception as e:
         print(f"\nTraining failed: {str(e)}")
         raise
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main(sys.argv[1:])
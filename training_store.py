@@ -0,0 +1,129 @@
+"""
+Typed binary copy of the training CSV.
+
+The first load after the CSV changes parses it once with pandas, applies
+the preprocessing callback of the caller, and writes every column as its
+own .npy file: numeric columns with their pandas dtype, text columns as
+int32 codes into a category list kept in the manifest (-1 for missing).
+Later loads read only the requested columns, memory-mapped, without
+touching the CSV parser.
+
+The store is tied to the SHA-256 of the CSV and a caller-supplied version
+(bump it when the preprocessing changes). A size or mtime change triggers
+a re-hash, and a different hash triggers a rebuild. Every build goes to a
+fresh training_store-<digest> directory next to the CSV and the
+training_store link is swapped atomically, so a concurrent reader never
+sees a half-written store.
+"""
+import json
+import os
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+
+STORE_DIR = 'training_store'
+MANIFEST_FILE = 'manifest.json'
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def source_stat(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def read_manifest(store):
+    try:
+        with open(os.path.join(store, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_manifest(store, manifest):
+    path = os.path.join(store, MANIFEST_FILE)
+    with open(f'{path}.tmp-{os.getpid()}', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(f'{path}.tmp-{os.getpid()}', path)
+
+def is_current(manifest, csv_path, version):
+    """Whether a manifest describes the CSV as it is now; hashes only when the file stat changed"""
+    if manifest is None or manifest['version'] != version:
+        return False
+    if manifest['source'] == source_stat(csv_path):
+        return True
+    return manifest['sha256'] == file_checksum(csv_path)
+
+def encode_column(series):
+    """(array, column spec) of one DataFrame column"""
+    if series.dtype.kind in 'biuf':
+        return series.to_numpy(), {'kind': 'numeric'}
+    codes, categories = pd.factorize(series, use_na_sentinel=True)
+    return codes.astype(np.int32), {'kind': 'categorical', 'categories': [str(value) for value in categories]}
+
+def build(csv_path, version, prepare):
+    """Convert the CSV into a new versioned store directory and point the store link at it"""
+    stat = source_stat(csv_path)
+    checksum = file_checksum(csv_path)
+    df = prepare(pd.read_csv(csv_path))
+
+    base = os.path.dirname(os.path.abspath(csv_path))
+    store = os.path.join(base, f"{STORE_DIR}-{hashlib.sha256(f'{version}:{checksum}'.encode()).hexdigest()[:16]}")
+    os.makedirs(store, exist_ok=True)
+    columns = {}
+    for i, name in enumerate(df.columns):
+        array, spec = encode_column(df[name])
+        spec['file'] = f'column_{i}.npy'
+        np.save(os.path.join(store, spec['file']), array)
+        columns[name] = spec
+
+    manifest = {'version': version, 'sha256': checksum, 'source': stat, 'rows': len(df), 'columns': columns}
+    write_manifest(store, manifest)
+
+    link = os.path.join(base, STORE_DIR)
+    previous = os.path.realpath(link) if os.path.islink(link) else None
+    tmp_link = f'{link}.tmp-{os.getpid()}'
+    os.symlink(os.path.basename(store), tmp_link)
+    os.replace(tmp_link, link)
+    if previous and previous != os.path.realpath(store):
+        shutil.rmtree(previous, ignore_errors=True)
+    return store, manifest
+
+def decode_column(array, spec):
+    if spec['kind'] == 'numeric':
+        return array
+    categories = np.array(spec['categories'], dtype=object)
+    values = np.full(len(array), np.nan, dtype=object)
+    present = array >= 0
+    values[present] = categories[array[present]]
+    return values
+
+def load(csv_path, version, prepare, columns=None):
+    """
+    DataFrame of the CSV after prepare(df), rebuilding the store first if
+    it is missing or stale. With columns, only those are read.
+    """
+    store = os.path.join(os.path.dirname(os.path.abspath(csv_path)), STORE_DIR)
+    manifest = read_manifest(store)
+    if is_current(manifest, csv_path, version):
+        store = os.path.realpath(store)
+        if manifest['source'] != source_stat(csv_path):
+            # Same content with a new mtime (touched or copied); skip the hash next time
+            manifest['source'] = source_stat(csv_path)
+            write_manifest(store, manifest)
+    else:
+        store, manifest = build(csv_path, version, prepare)
+
+    names = list(manifest['columns']) if columns is None else list(columns)
+    missing = [name for name in names if name not in manifest['columns']]
+    if missing:
+        raise KeyError(f"Columns not in training data: {', '.join(missing)}")
+
+    data = {}
+    for name in names:
+        spec = manifest['columns'][name]
+        data[name] = decode_column(np.load(os.path.join(store, spec['file']), mmap_mode='r'), spec)
+    return pd.DataFrame(data, columns=names)
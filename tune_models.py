@@ -0,0 +1,211 @@
+"""
+Tree count and depth sweep with inference cost.
+
+Fits every model of train_model.py for each (n_estimators, max_depth) of a
+grid on the usual train split and measures, per configuration:
+
+    metric      held-out accuracy (classifiers) or MSE (regressors)
+    latency_ms  median single-row prediction through the compiled engine
+    size        joblib pickle bytes and compiled array bytes
+
+The report lists every point and the Pareto frontier of each model (no
+other point is at least as good on metric, latency and pickle size and
+better on one). With --budget-ms, one frontier point per model is picked
+so that the summed latency fits the per-test budget, giving up the least
+metric per millisecond saved; without it the best-metric point is picked.
+--write-config stores the picks in model_config.json of the model
+directory, which train_model.py applies on the next training run.
+
+    python tune_models.py [--trees 25,50,100,150,200] [--depths 4,6,10,16,none]
+                          [--models personality,disc,...] [--budget-ms MS]
+                          [--repeat N] [--output report.json] [--write-config]
+"""
+import sys
+import json
+import os
+import io
+import time
+import statistics
+import numpy as np
+import joblib
+from sklearn.base import clone
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import accuracy_score, mean_squared_error
+import train_model
+import forest_engine
+
+USAGE = ("Usage: python tune_models.py [--trees N,N,...] [--depths D,D,...|none] [--models NAME,...] "
+         "[--budget-ms MS] [--repeat N] [--output PATH] [--write-config]")
+
+DEFAULT_TREES = '25,50,100,150,200'
+DEFAULT_DEPTHS = '4,6,10,16,none'
+
+def parse_depth(value):
+    return None if value.lower() == 'none' else int(value)
+
+def sweep_models(names, trees, depths):
+    """One unfitted model per (name, n_estimators, max_depth), keyed 'name|trees|depth'"""
+    base = train_model.build_models()
+    grid = {}
+    for name in names:
+        for n_estimators in trees:
+            for max_depth in depths:
+                model = clone(base[name]).set_params(n_estimators=n_estimators, max_depth=max_depth)
+                grid[f'{name}|{n_estimators}|{max_depth}'] = model
+    return grid
+
+def pickle_size(model):
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return buffer.getbuffer().nbytes
+
+def single_row_latency(model, name, row, repeat):
+    """Median ms to predict one row with the compiled engine"""
+    meta, arrays = forest_engine.compile_models({name: model})
+    models = forest_engine.CompiledModelSet(meta, arrays)
+    models.predict(row, [name])
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        models.predict(row, [name])
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), sum(array.nbytes for array in arrays.values())
+
+def measure(key, model, X_test, y_test, repeat):
+    name, n_estimators, max_depth = key.split('|')
+    if name in train_model.CLASSIFIERS:
+        metric = accuracy_score(y_test, model.predict(X_test))
+    else:
+        metric = mean_squared_error(y_test, model.predict(X_test))
+    latency, compiled_bytes = single_row_latency(model, name, X_test[:1], repeat)
+    return {
+        'n_estimators': int(n_estimators),
+        'max_depth': None if max_depth == 'None' else int(max_depth),
+        'metric': 'accuracy' if name in train_model.CLASSIFIERS else 'mse',
+        'value': round(float(metric), 6),
+        'latency_ms': round(latency, 4),
+        'pickle_bytes': pickle_size(model),
+        'compiled_bytes': compiled_bytes,
+        'nodes': int(sum(tree.tree_.node_count for tree in model.estimators_))
+    }
+
+def loss(point):
+    """Lower is better for every objective"""
+    return point['value'] if point['metric'] == 'mse' else -point['value']
+
+def pareto_frontier(points):
+    """Points not dominated on (metric, latency, pickle size), fastest first"""
+    objectives = [(loss(p), p['latency_ms'], p['pickle_bytes']) for p in points]
+    frontier = []
+    for i, a in enumerate(objectives):
+        dominated = any(
+            all(x <= y for x, y in zip(b, a)) and any(x < y for x, y in zip(b, a))
+            for j, b in enumerate(objectives) if j != i
+        )
+        if not dominated:
+            frontier.append(points[i])
+    return sorted(frontier, key=lambda p: p['latency_ms'])
+
+def relative_loss(point, best):
+    """Metric given up against the best point: accuracy points, or MSE increase as a fraction"""
+    if point['metric'] == 'accuracy':
+        return best['value'] - point['value']
+    return (point['value'] - best['value']) / best['value'] if best['value'] else 0.0
+
+def select_under_budget(frontiers, budget_ms=None):
+    """
+    Pick one frontier point per model. Starts from the best metric of each
+    model and, while the summed latency exceeds the budget, moves the model
+    whose next faster point costs the least metric per millisecond saved.
+    """
+    best = {name: min(points, key=loss) for name, points in frontiers.items()}
+    selection = dict(best)
+    if budget_ms is None:
+        return selection, True
+
+    while sum(point['latency_ms'] for point in selection.values()) > budget_ms:
+        candidates = []
+        for name, point in selection.items():
+            faster = [p for p in frontiers[name] if p['latency_ms'] < point['latency_ms']]
+            if not faster:
+                continue
+            step = max(faster, key=lambda p: p['latency_ms'])
+            saved = point['latency_ms'] - step['latency_ms']
+            cost = relative_loss(step, best[name]) - relative_loss(point, best[name])
+            candidates.append((cost / saved, name, step))
+        if not candidates:
+            return selection, False
+        _, name, step = min(candidates, key=lambda candidate: candidate[0])
+        selection[name] = step
+    return selection, True
+
+def main(argv):
+    options = {
+        '--trees': DEFAULT_TREES, '--depths': DEFAULT_DEPTHS, '--models': None,
+        '--budget-ms': None, '--repeat': '50', '--output': None
+    }
+    args = list(argv)
+    write_config = '--write-config' in args
+    if write_config:
+        args.remove('--write-config')
+    while args:
+        flag = args.pop(0)
+        if flag not in options or not args:
+            raise ValueError(USAGE)
+        options[flag] = args.pop(0)
+
+    trees = [int(value) for value in options['--trees'].split(',')]
+    depths = [parse_depth(value) for value in options['--depths'].split(',')]
+    names = options['--models'].split(',') if options['--models'] else list(train_model.build_models())
+    budget = float(options['--budget-ms']) if options['--budget-ms'] else None
+
+    df = train_model.load_and_preprocess_data(train_model.model_columns())
+    X = df[train_model.feature_columns()].values
+    y = train_model.build_targets(df)
+    unknown = [name for name in names if name not in y]
+    if unknown:
+        raise ValueError(f"Unknown models: {', '.join(unknown)}")
+
+    # Same split as train_model.train_models
+    train_indices, test_indices = train_test_split(np.arange(len(X)), test_size=0.2, random_state=42)
+    grid = sweep_models(names, trees, depths)
+    targets = {key: y[key.split('|')[0]][train_indices] for key in grid}
+    fitted, _ = train_model.fit_models(grid, X[train_indices], targets)
+
+    points = {name: [] for name in names}
+    for key, model in fitted.items():
+        name = key.split('|')[0]
+        points[name].append(measure(key, model, X[test_indices], y[name][test_indices], int(options['--repeat'])))
+
+    frontiers = {name: pareto_frontier(name_points) for name, name_points in points.items()}
+    selection, within_budget = select_under_budget(frontiers, budget)
+    report = {
+        'models': {name: {'points': points[name], 'pareto': frontiers[name]} for name in names},
+        'selection': {name: {k: point[k] for k in ('n_estimators', 'max_depth', 'value', 'latency_ms')}
+                      for name, point in selection.items()},
+        'budget_ms': budget,
+        'total_latency_ms': round(sum(point['latency_ms'] for point in selection.values()), 4),
+        'within_budget': within_budget
+    }
+
+    if options['--output']:
+        with open(options['--output'], 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if write_config:
+        config_path = os.path.join(train_model.MODEL_DIR, train_model.MODEL_CONFIG_FILE)
+        config = {}
+        if os.path.exists(config_path):
+            with open(config_path) as f:
+                config = json.load(f)
+        for name, point in selection.items():
+            config[name] = {'n_estimators': point['n_estimators'], 'max_depth': point['max_depth']}
+        with open(config_path, 'w') as f:
+            json.dump(config, f, indent=2)
+
+    print(json.dumps(report['selection'] if options['--output'] else report, indent=2))
+    if not within_budget:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])